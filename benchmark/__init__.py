@@ -0,0 +1,3 @@
+""" Server benchmark on a synthetic archive, run from the project root:
+    python3 -m benchmark [--days 2] [--cameras 1] [--requests 200] [--json result.json] [--compare previous.json]
+"""
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from .runner import Runner, get_commit, report, save
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark', description='Cams PWA server benchmark')
+    parser.add_argument('--cameras', type=int, default=1)
+    parser.add_argument('--days', type=int, default=2, help='archive days including today')
+    parser.add_argument('--segments', type=int, default=15, help='segments per minute')
+    parser.add_argument('--images', type=int, default=500, help='events images per day')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='not measured requests per scenario')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--root', default='', help='archive folder (kept), a temporary one by default')
+    parser.add_argument('--json', default='', help='save the results to the file')
+    parser.add_argument('--compare', default='', help='previous results file')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix='cams-bench-')
+    try:
+        runner = Runner(root, args.cameras, args.days, args.segments, args.images, args.requests, args.warmup,
+                        args.seed)
+        runner.prepare()
+        results = {
+            'commit': get_commit(),
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'params': runner.params,
+            'results': asyncio.run(runner.run()),
+        }
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    report(results, previous)
+    if args.json:
+        save(args.json, results)
+
+
+if __name__ == '__main__':
+    main()
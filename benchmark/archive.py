@@ -0,0 +1,85 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+
+class Archive:
+    """ Synthetic camera archive: storage_path/<folder>/<day>/<HH>/<MM>/<SS>.mp4 segments and
+        events_path/<folder>/<day>|live/*.jpg images.
+        Files are sparse (only the sizes are real), the sizes follow a noisy base level with motion spikes.
+        The same seed gives the same archive, so the results are comparable across commits.
+    """
+    SEGMENT_SIZE = 250 * 1024  # average segment size, bytes
+    SIZE_NOISE = 0.15  # lognormal sigma
+    MOTION_PROBABILITY = 0.002  # per segment
+    MOTION_FACTOR = (2.5, 4.0)
+    MOTION_LENGTH = (3, 8)  # segments
+    IMAGE_SIZE = (40 * 1024, 160 * 1024)
+
+    def __init__(self, root: str, cameras: int, days: int, segments_per_minute: int, images_per_day: int,
+                 seed: int = 1):
+        self.root = root
+        self.storage_path = f'{root}/storage'
+        self.events_path = f'{root}/events'
+        self.folders = [f'cam{i + 1}' for i in range(cameras)]
+        self._days = days
+        self._segments_per_minute = segments_per_minute
+        self._images_per_day = images_per_day
+        self._random = random.Random(seed)
+        self.segments = 0
+        self.images = 0
+
+    def generate(self) -> None:
+        """ Archive of the given days ending at the current minute (the last minutes are "live")
+        """
+        now = datetime.now().replace(second=0, microsecond=0)
+        start = (now - timedelta(days=self._days - 1)).replace(hour=0, minute=0)
+        for folder in self.folders:
+            self._generate_storage(folder, start, now)
+            self._generate_events(folder, start, now)
+
+    def _generate_storage(self, folder: str, start: datetime, end: datetime) -> None:
+        duration = 60 // self._segments_per_minute
+        base = self.SEGMENT_SIZE * self._random.uniform(0.5, 1.5)  # cameras differ
+        motion_left, motion_factor = 0, 1.0
+        minute = start
+        while minute <= end:
+            path = f'{self.storage_path}/{folder}/{minute.strftime("%Y-%m-%d/%H/%M")}'
+            os.makedirs(path, exist_ok=True)
+            for i in range(self._segments_per_minute):
+                if not motion_left and self._random.random() < self.MOTION_PROBABILITY:
+                    motion_left = self._random.randint(*self.MOTION_LENGTH)
+                    motion_factor = self._random.uniform(*self.MOTION_FACTOR)
+                factor = motion_factor if motion_left else 1.0
+                motion_left = max(0, motion_left - 1)
+                size = int(base * factor * self._random.lognormvariate(0, self.SIZE_NOISE))
+                self._create(f'{path}/{i * duration:02d}.mp4', size)
+                self.segments += 1
+            minute += timedelta(minutes=1)
+
+    def _generate_events(self, folder: str, start: datetime, end: datetime) -> None:
+        """ Past days are rotated into the day folders, today's images are in the live one
+        """
+        day = start
+        while day <= end:
+            name = 'live' if day.date() == end.date() else day.strftime('%Y-%m-%d')
+            path = f'{self.events_path}/{folder}/{name}'
+            os.makedirs(path, exist_ok=True)
+            seconds = (end - day).total_seconds() if name == 'live' else 86400
+            count = max(1, int(self._images_per_day * seconds / 86400))
+            for moment in self._get_moments(day, seconds, count):
+                file_path = f'{path}/{moment.strftime("%Y%m%d%H%M%S")}{self._random.randint(0, 99):02d}.jpg'
+                self._create(file_path, self._random.randint(*self.IMAGE_SIZE))
+                timestamp = moment.timestamp()
+                os.utime(file_path, (timestamp, timestamp))
+                self.images += 1
+            day += timedelta(days=1)
+
+    def _get_moments(self, start: datetime, seconds: float, count: int) -> List[datetime]:
+        return sorted(start + timedelta(seconds=self._random.uniform(0, seconds)) for _ in range(count))
+
+    @staticmethod
+    def _create(path: str, size: int) -> None:
+        with open(path, 'wb') as file:
+            file.truncate(size)  # sparse
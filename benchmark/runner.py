@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Callable, Any, Optional
+from .archive import Archive
+
+SERVER_PATH = os.path.realpath(f'{os.path.dirname(os.path.realpath(__file__))}/../server')
+
+CONFIG_TEMPLATE = '''class Config:
+    cameras = {cameras}
+    groups = {{}}
+    title = 'Bench'
+    web_title = 'Bench'
+    web_server_host = '127.0.0.1'
+    web_server_port = {port}
+    web_server_name = 'Cams PWA'
+    master_cam_hash = 'bench-master'
+    master_password_hash = '03ac674216f3e15c761ee1a5e255f067953623c8b388b4459e13f978d7c846f4'
+    cam_password_hash = '0ffe1abd1a08215353c233d6e009613e95eec4253832a761af28ff37ac5a150c'
+    encryption_key = 'Bench Encryption Key'
+    ssl_certificate = '{root}/bench.crt'
+    ssl_private_key = '{root}/bench.key'
+    min_segment_duration = 4
+    log_file = '{root}/bench.log'
+    storage_path = '{storage_path}'
+    events_path = '{events_path}'
+    storage_command = ''
+    storage_period_days = {days}
+    events_period_days = {days}
+    debug = False
+    storage_enabled = False
+    events_enabled = False
+    web_enabled = True
+'''
+
+
+class Client:
+    """ Minimal HTTP/1.1 keep-alive client over TLS
+    """
+    def __init__(self, port: int, cookie: str):
+        self._port = port
+        self._cookie = cookie
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, path: str) -> Tuple[int, int]:
+        """ Status and body length
+        """
+        if not self._writer:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            self._reader, self._writer = await asyncio.open_connection('127.0.0.1', self._port, ssl=context)
+        self._writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: auth={self._cookie}\r\n'
+            f'Accept-Encoding: gzip\r\n\r\n'.encode())
+        head = (await self._reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(head[0].split()[1])
+        headers = {k.lower(): v.strip() for k, _sep, v in (row.partition(':') for row in head[1:] if row)}
+        length = int(headers.get('content-length', 0))
+        if length:
+            await self._reader.readexactly(length)
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, length
+
+    def close(self) -> None:
+        if self._writer:
+            self._writer.close()
+        self._reader, self._writer = None, None
+
+
+class Runner:
+    """ Generates the archive, starts the web server in-process and measures the request scenarios.
+        Reports p50/p99 latency, forks per request (system-wide, /proc/stat) and the process RSS.
+    """
+    def __init__(self, root: str, cameras: int, days: int, segments_per_minute: int, images_per_day: int,
+                 requests: int, warmup: int, seed: int):
+        self._root = root
+        self._requests = requests
+        self._warmup = warmup
+        self._seed = seed
+        self._days = days
+        self._archive = Archive(root, cameras, days, segments_per_minute, images_per_day, seed)
+        self.params = {
+            'cameras': cameras, 'days': days, 'segments_per_minute': segments_per_minute,
+            'images_per_day': images_per_day, 'requests': requests, 'seed': seed,
+        }
+
+    def prepare(self) -> None:
+        start = time.monotonic()
+        self._archive.generate()
+        print(f'Archive: {self._archive.segments} segments, {self._archive.images} images '
+              f'({round(time.monotonic() - start, 1)}s)')
+
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+             '-keyout', f'{self._root}/bench.key', '-out', f'{self._root}/bench.crt'],
+            check=True, capture_output=True)
+
+        cameras = {
+            f'bench-{folder}': {
+                'folder': folder, 'url': 'rtsp://127.0.0.1', 'name': folder, 'codecs': 'avc1.42E01E',
+                'storage_command': '', 'sensitivity': 1.5, 'events': True,
+            } for folder in self._archive.folders
+        }
+        with open(f'{self._root}/_config.py', 'w') as file:
+            file.write(CONFIG_TEMPLATE.format(
+                cameras=repr(cameras), port=self._get_free_port(), root=self._root, days=self._days + 1,
+                storage_path=self._archive.storage_path, events_path=self._archive.events_path))
+
+    async def run(self) -> Dict[str, Any]:
+        sys.path.insert(0, SERVER_PATH)
+        sys.path.insert(0, self._root)  # the benchmark _config
+        from _config import Config
+        from auth import Auth
+        from metrics import Metrics
+        import web
+
+        server = asyncio.create_task(web.Server.run())
+        await self._wait_port(Config.web_server_port)
+        client = Client(Config.web_server_port, Auth.encrypt(Config.master_cam_hash))
+        hashes = list(Config.cameras.keys())
+        rnd = random.Random(self._seed)
+
+        # The first motions request reads every day (and writes the sizes files)
+        start = time.monotonic()
+        for cam_hash in hashes:
+            await client.get(f'/?video=motions&md=50&hash={cam_hash}')
+        results: Dict[str, Any] = {'cold_motions_ms': round((time.monotonic() - start) * 1000 / len(hashes), 3)}
+
+        for name, scenario in self._get_scenarios(rnd).items():
+            results[name] = await self._measure(client, lambda: scenario(rnd.choice(hashes)), Metrics)
+
+        client.close()
+        await asyncio.sleep(0.1)  # the server side of the connection is closed by EOF
+        server.cancel()
+        return results
+
+    def _get_scenarios(self, rnd: random.Random) -> Dict[str, Callable[[str], str]]:
+        now = datetime.now()
+        start = (now - timedelta(days=self._days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        span = (now - start).total_seconds() - 120
+
+        def dt() -> str:
+            return (start + timedelta(seconds=rnd.uniform(0, span))).strftime('%Y%m%d%H%M%S')
+
+        return {
+            'live': lambda h: f'/?video=live&hash={h}',
+            'next': lambda h: f'/?video=next&step={rnd.choice((-600, -60, -4, 4, 60, 600))}&dt={dt()}&hash={h}',
+            'range': lambda h: f'/?video=range&range={rnd.randint(0, 2000)}&hash={h}',
+            'motion_search': lambda h: f'/?video=next&step={rnd.choice((-60, 60))}&md=50&dt={dt()}&hash={h}',
+            'motions': lambda h: f'/?video=motions&md=50&hash={h}',
+            'events_range': lambda h: f'/?image=range&range={rnd.randint(0, 2000)}&hash={h}',
+            'events_next': lambda h: f'/?image=next&step=-1&hash={h}',
+            'page': lambda h: rnd.choice((f'/?page=cam&hash={h}', f'/?page=events&hash={h}', '/')),
+            'static': lambda h: '/js/player.js',
+        }
+
+    async def _measure(self, client: Client, get_path: Callable[[], str], metrics) -> Dict[str, Any]:
+        for _ in range(self._warmup):
+            await client.get(get_path())
+
+        forks = self._get_forks()
+        subprocesses = self._get_subprocesses(metrics)
+        latencies: List[float] = []
+        errors = 0
+        for _ in range(self._requests):
+            path = get_path()
+            start = time.perf_counter()
+            status, _length = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+        latencies.sort()
+        return {
+            'p50_ms': round(self._percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(self._percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'forks_per_request': round((self._get_forks() - forks) / self._requests, 3) if forks >= 0 else None,
+            'subprocesses_per_request': round((self._get_subprocesses(metrics) - subprocesses) / self._requests, 3),
+            'errors': errors,
+            'rss_kb': self._get_rss(),
+        }
+
+    @staticmethod
+    def _percentile(values: List[float], percent: float) -> float:
+        """ Nearest rank of the sorted values
+        """
+        return values[max(0, min(len(values) - 1, int(round(percent / 100 * len(values) + 0.5)) - 1))]
+
+    @staticmethod
+    def _get_forks() -> int:
+        """ Processes created since boot (all the system), -1 if unknown
+        """
+        try:
+            with open('/proc/stat') as file:
+                for row in file:
+                    if row.startswith('processes '):
+                        return int(row.split()[1])
+        except OSError:
+            pass
+        return -1
+
+    @staticmethod
+    def _get_subprocesses(metrics) -> int:
+        """ Subprocesses started by the server code (see Metrics)
+        """
+        rendered = metrics.render()
+        return sum(int(float(row.split()[-1])) for row in rendered.splitlines()
+                   if row.startswith('cams_subprocesses_total'))
+
+    @staticmethod
+    def _get_rss() -> int:
+        try:
+            with open('/proc/self/status') as file:
+                for row in file:
+                    if row.startswith('VmRSS:'):
+                        return int(row.split()[1])
+        except OSError:
+            pass
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    @staticmethod
+    def _get_free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    async def _wait_port(port: int) -> None:
+        for _ in range(100):
+            try:
+                _reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.05)
+        raise RuntimeError(f'The server is not started on port {port}')
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_PATH,
+                              capture_output=True, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def report(results: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+    """ Print the results table, with the p50/p99 ratios to the previous run if given
+    """
+    print(f'{"scenario":<16}{"p50 ms":>10}{"p99 ms":>10}{"forks/req":>11}{"rss KiB":>10}'
+          + (f'{"p50 x":>8}{"p99 x":>8}' if previous else ''))
+    for name, row in results['results'].items():
+        if not isinstance(row, dict):
+            print(f'{name:<16}{row:>10}')
+            continue
+        forks = '' if row['forks_per_request'] is None else row['forks_per_request']
+        line = f'{name:<16}{row["p50_ms"]:>10}{row["p99_ms"]:>10}{forks:>11}{row["rss_kb"]:>10}'
+        prev = previous['results'].get(name) if previous else None
+        if isinstance(prev, dict):
+            line += f'{row["p50_ms"] / max(prev["p50_ms"], 0.001):>8.2f}{row["p99_ms"] / max(prev["p99_ms"], 0.001):>8.2f}'
+        print(line)
+
+
+def save(path: str, results: Dict[str, Any]) -> None:
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
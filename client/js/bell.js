@@ -10,6 +10,8 @@ class Bell {
         this._lastDateTime = 0;
         this._modal = document.querySelector('.modal');
         this._abortController;
+        this._eventSource;
+        this._sseFailed = !('EventSource' in window);
         this._pending = false;
 
         if (localStorage.getItem('bell')) {
@@ -22,9 +24,7 @@ class Bell {
             this._dimmOff();
             if (e.target.tagName == 'A' || e.target.closest('.link')) {
                 this._pending = true;
-                if (this._abortController) {
-                    this._abortController.abort();
-                }
+                this._stop();
             } else {
                 this._dimmOn();
             }
@@ -64,9 +64,7 @@ class Bell {
             if (this._wakeLockSentinel && !this._isPlaying) {
                 this._wakeLockSentinel.release();
             }
-            if (this._abortController) {
-                this._abortController.abort();
-            }
+            this._stop();
         } else {
             this._btnBell.classList.add('selected');
             localStorage.setItem('bell', '1');
@@ -110,11 +108,44 @@ class Bell {
         }
     }
 
+    static _stop = () => {
+        clearTimeout(this._fetchTimeoutId);
+        if (this._eventSource) {
+            this._eventSource.close();
+            this._eventSource = null;
+        }
+        if (this._abortController) {
+            this._abortController.abort();
+        }
+    }
+
+    static _listen = () => {
+        const dt = this._lastDateTime ? `&dt=${this._lastDateTime}` : '';
+        this._eventSource = new EventSource(`/?bell=sse${dt}`);
+        this._eventSource.onmessage = e => {
+            this._notify(JSON.parse(e.data));
+        }
+        this._eventSource.onerror = () => {
+            if (!this._eventSource || this._eventSource.readyState != EventSource.CLOSED) {
+                return; // reconnecting by the browser
+            }
+            // the stream isn't supported on the way to the server, switch to the long polling
+            this._eventSource = null;
+            this._sseFailed = true;
+            if (!this._pending) {
+                this._fetchTimeoutId = window.setTimeout(this._fetch, 10000);
+            }
+        }
+    }
+
     static _fetch = () => {
         clearTimeout(this._fetchTimeoutId);
         if (!this._btnBell.classList.contains('selected')) {
             return;
         }
+        if (!this._sseFailed) {
+            return this._eventSource || this._listen();
+        }
         this._abortController = new AbortController();
         fetch(`/?bell=1&dt=${this._lastDateTime}`, {
             cache: 'no-store',
@@ -125,26 +156,7 @@ class Bell {
             })
             .then(data => {
                 this._fetchTimeoutId = window.setTimeout(this._fetch);
-                if (!Object.keys(data).length || !this._btnBell.classList.contains('selected')) {
-                    return
-                }
-                let res = []
-                Object.entries(data).forEach(([hash, row]) => {
-                    if (row.dt <= this._lastDateTime) {
-                        return;  // continue forEach
-                    }
-                    const hm = row.dt.slice(-6,-4) + ':' + row.dt.slice(-4,-2)
-                    res.push(`<a href="/?page=cam&hash=${hash}">${row.name}</a><i>${hm}<i>`);
-                    this._lastDateTime = row.dt;
-                    this._updateNavList(hash, hm);
-                });
-                if (!res.length) {
-                    return
-                }
-                this._modal.querySelector('.content').innerHTML = res.join('<br>');
-                this._modal.classList.remove('hidden');
-                document.body.classList.add('dimmed');
-                this._audio.play(); // can fall with "user didn't interact" exception, place this line at the end
+                this._notify(data);
             })
             .catch(() => {
                 if (!this._pending) {
@@ -152,4 +164,27 @@ class Bell {
                 }
             });
     }
+
+    static _notify = (data) => {
+        if (!Object.keys(data).length || !this._btnBell.classList.contains('selected')) {
+            return
+        }
+        let res = []
+        Object.entries(data).forEach(([hash, row]) => {
+            if (row.dt <= this._lastDateTime) {
+                return;  // continue forEach
+            }
+            const hm = row.dt.slice(-6,-4) + ':' + row.dt.slice(-4,-2)
+            res.push(`<a href="/?page=cam&hash=${hash}">${row.name}</a><i>${hm}<i>`);
+            this._lastDateTime = row.dt;
+            this._updateNavList(hash, hm);
+        });
+        if (!res.length) {
+            return
+        }
+        this._modal.querySelector('.content').innerHTML = res.join('<br>');
+        this._modal.classList.remove('hidden');
+        document.body.classList.add('dimmed');
+        this._audio.play(); // can fall with "user didn't interact" exception, place this line at the end
+    }
 }
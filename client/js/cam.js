@@ -57,6 +57,7 @@ class Cam extends Base {
         };
         this.motionRange.onchange = () => {
             localStorage.setItem('motion_' + this._hash, this.motionRange.value);
+            this._showMotions();
         };
         if (localStorage.getItem('speed_' + this._hash)) {
             this.speedRange.value = localStorage.getItem('speed_' + this._hash);
@@ -105,6 +106,34 @@ class Cam extends Base {
             this.btnMotion.classList.add('selected');
             this.motionRange.classList.remove('hidden');
         }
+        this._showMotions();
+    }
+
+    _showMotions = () => { // motion ticks on the time range
+        const svg = this.footer.querySelector('.motions');
+        svg.innerHTML = '';
+        if (!this.btnMotion.classList.contains('selected')) {
+            return;
+        }
+        fetch(`/?video=motions&md=${this.motionRange.value}&hash=${this._hash}`, {cache: 'no-store'})
+            .then(r => {
+                return r.json();
+            })
+            .then(motions => {
+                if (!this.btnMotion.classList.contains('selected')) {
+                    return;
+                }
+                svg.innerHTML = '';
+                motions.forEach(row => {
+                    const tick = document.createElementNS('http://www.w3.org/2000/svg', 'rect');
+                    tick.setAttribute('x', `${row.range * 100 / this.MAX_RANGE}%`);
+                    tick.setAttribute('y', '30%');
+                    tick.setAttribute('height', '40%');
+                    tick.setAttribute('width', '2');
+                    svg.appendChild(tick);
+                });
+            })
+            .catch(() => {});
     }
 
     _toggleSpeed = () => {
@@ -5,7 +5,7 @@ class Events extends Base {
         const urlParams = new URLSearchParams(window.location.search);
         this._hash = urlParams.get('hash');
         this._timeoutId;
-        this._slider = new Slider(image, this._hash, camInfo);
+        this._slider = new Slider(image, this._hash, camInfo, chartData);
         this._chartData = chartData;
     }
 
@@ -9,16 +9,22 @@ class Group extends Base {
         for (let hash in this._cams) {
             const frame = document.createElement('div');
             frame.classList.add('video-box', 'link');
-            const video = document.createElement('video');
-            frame.append(video);
+            const image = document.createElement('img');
+            frame.append(image);
             box.append(frame);
 
             frame.onclick = () => {
                 frame.classList.add('blink');
                 document.location.href = `/?page=cam&hash=${hash}`;
             }
-            const player = new Player(video, hash, this._cams[hash]);
-            player.start();
+            // Low quality frames save the bandwidth, full video is played if the camera has no preview
+            const preview = new Preview(image, hash, () => {
+                const video = document.createElement('video');
+                image.replaceWith(video);
+                const player = new Player(video, hash, this._cams[hash]);
+                player.start();
+            });
+            preview.start();
         }
         document.querySelector('main').onclick = this.resizeBars;
         document.onscroll = this.hideBars;
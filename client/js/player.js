@@ -101,6 +101,7 @@ class Player extends Base {
             this.btnMotion.classList.remove('selected');
             this.speedRange.classList.add('hidden');
             this.motionRange.classList.add('hidden');
+            this.footer.querySelector('.motions').innerHTML = '';
             for (const e of this.footer.querySelectorAll('.arch')) {
                 e.classList.add('disabled');
             }
@@ -136,7 +137,7 @@ class Player extends Base {
         let datetime, rng;
         this._abortController = new AbortController();
         fetch(url, {
-            cache: 'no-store',
+            cache: this._playMode == 'live' ? 'no-store' : 'default', // archive segments are cacheable
             signal: this._abortController.signal
         })
             .then(r => {
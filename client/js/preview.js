@@ -0,0 +1,57 @@
+class Preview extends Base {
+    INTERVAL = 2000; // the preview command writes a frame every few seconds
+
+    constructor(image, hash, fallback) {
+        super();
+        this._image = image;
+        this._hash = hash;
+        this._url = '/?video=live&quality=low&hash=' + hash;
+        this._fallback = fallback; // called if the camera has no preview
+        this._etag = '';
+        this._started = false;
+    }
+
+    start = () => {
+        if (!window.frameLoading) {
+            window.frameLoading = {};
+        }
+        window.frameLoading[this._hash] = 1;
+        this._fetch();
+    }
+
+    _fetch = () => {
+        fetch(this._url, { cache: 'no-cache' }) // revalidated by the server (ETag)
+            .then(r => {
+                if (r.status == 404 && !this._started) {
+                    this._fallback();
+                    return null;
+                }
+                const etag = r.headers.get('ETag');
+                if (!r.ok || etag == this._etag) {
+                    return undefined; // not modified
+                }
+                this._etag = etag;
+                return r.blob();
+            })
+            .then(data => {
+                if (data === null) {
+                    return; // stop
+                }
+                if (data && data.size) {
+                    URL.revokeObjectURL(this._image.src);
+                    this._image.src = URL.createObjectURL(data);
+                    if (!this._started) {
+                        this._started = true;
+                        delete window.frameLoading[this._hash];
+                        if (!Object.keys(window.frameLoading).length) {
+                            this.loader.classList.add('hidden');
+                        }
+                    }
+                }
+                window.setTimeout(this._fetch, this.INTERVAL);
+            })
+            .catch(error => {
+                window.setTimeout(this._fetch, this.INTERVAL);
+            });
+    }
+}
@@ -1,5 +1,5 @@
 class Slider extends Base {
-    constructor(image, hash, camInfo) {
+    constructor(image, hash, camInfo, chartData = []) {
         super();
         this._image = image;
         this._hash = hash;
@@ -9,6 +9,11 @@ class Slider extends Base {
         this._lock = false;
         this._loading = false;
         this._abortController;
+        this._counts = chartData; // images per folder, the same positions as the server ranges
+        this._sprites = {}; // folder index: sheets index, see ?image=sprite
+        this._sheets = {}; // url: loaded sheet image
+        this._canvas = document.createElement('canvas');
+        this._previewRange = null;
     }
 
     run = () => {
@@ -35,14 +40,84 @@ class Slider extends Base {
 
     onRangeInput = (range) => { // move
         this._lock = true;
+        if (this._showPreview(range)) {
+            this._previewRange = range;
+            return;
+        }
+        this._previewRange = null;
         this._fetch(this._rangeUrl, { range: range });
     }
 
     onRangeChange = (callback) => { // release
         this._lock = false;
+        if (this._previewRange !== null) { // replace the thumbnail by the full image
+            const range = this._previewRange;
+            this._previewRange = null;
+            this._fetch(this._rangeUrl, { range: range }, callback, true);
+            return;
+        }
         callback();
     }
 
+    _showPreview = (range) => {
+        if (!this._counts.length) {
+            return false;
+        }
+        // Images._get_by_range() on the server side
+        range = Math.min(Math.max(range, 0), this.MAX_RANGE - 1);
+        const rangeFolder = this.MAX_RANGE / this._counts.length;
+        const folderIdx = Math.floor(range / rangeFolder);
+        const fileIdx = Math.floor((range / rangeFolder - folderIdx) * this._counts[folderIdx]);
+
+        const sprites = this._sprites[folderIdx];
+        if (sprites === undefined) {
+            this._loadSprites(folderIdx);
+            return false;
+        }
+        const sprite = sprites.find(s => s.first <= fileIdx && fileIdx <= s.last);
+        if (!sprite) {
+            return false;
+        }
+        const sheet = this._sheets[sprite.src];
+        if (!sheet) {
+            this._sheets[sprite.src] = new Image();
+            this._sheets[sprite.src].src = sprite.src;
+            return false;
+        }
+        if (!sheet.complete || !sheet.naturalWidth) {
+            return false;
+        }
+
+        let cell = 0; // the nearest thumbnail
+        sprite.cells.forEach((idx, i) => {
+            if (Math.abs(idx - fileIdx) < Math.abs(sprite.cells[cell] - fileIdx)) {
+                cell = i;
+            }
+        });
+        this._canvas.width = sprite.width;
+        this._canvas.height = sprite.height;
+        this._canvas.getContext('2d').drawImage(
+            sheet,
+            (cell % sprite.columns) * sprite.width, Math.floor(cell / sprite.columns) * sprite.height,
+            sprite.width, sprite.height, 0, 0, sprite.width, sprite.height);
+        this._image.src = this._canvas.toDataURL('image/jpeg');
+        return true;
+    }
+
+    _loadSprites = (folderIdx) => {
+        this._sprites[folderIdx] = []; // once per page
+        fetch('/?image=sprite&folder=' + folderIdx + '&hash=' + this._hash)
+            .then(r => r.ok ? r.json() : [])
+            .then(sprites => {
+                this._sprites[folderIdx] = sprites;
+                sprites.forEach(s => {
+                    this._sheets[s.src] = new Image();
+                    this._sheets[s.src].src = s.src;
+                });
+            })
+            .catch(error => {});
+    }
+
     _getUrl = (url, args = {}) => {
         Object.entries(args).forEach(([key, val]) => {
             url = url.replace('{' + key + '}', val);
@@ -60,7 +135,7 @@ class Slider extends Base {
         let position, rng;
         this._abortController = new AbortController();
         fetch(url, {
-            cache: 'no-store',
+            cache: 'default', // revalidated by the server (ETag)
             signal: this._abortController.signal
         })
             .then(r => {
@@ -1,13 +1,28 @@
 import json
+import hmac
+import base64
 import hashlib
+import threading
 import subprocess
+from collections import OrderedDict
 from urllib.parse import quote_plus, unquote_plus
 from typing import Optional
 from _config import Config
+from metrics import Metrics
 from log import Log
 
 
 class Auth:
+    """ Auth cookie is an HMAC-SHA256 signed token: v1.<base64 cam hash>.<base64 signature>.
+        Old openssl encrypted cookies are still accepted (and replaced on the next page load).
+    """
+    TOKEN_VERSION = 'v1'
+    CACHE_SIZE = 1024
+
+    _key = b''
+    _cache = OrderedDict()  # cookie value: decrypted info (None if invalid)
+    _lock = threading.Lock()
+
     def __init__(self, encrypted):
         self._info = self.decrypt(encrypted)
 
@@ -31,33 +46,84 @@ class Auth:
 
         # todo: add cam to list
 
-    @staticmethod
-    def encrypt(decrypted: str) -> Optional[str]:
+    @classmethod
+    def encrypt(cls, decrypted: str) -> Optional[str]:
         if not decrypted:
             return
-        cmd = (
-            f'echo "{decrypted.strip()}" | '
-            f'openssl enc -e -base64 -aes-256-cbc -k "{Config.encryption_key}" -pbkdf2')
-        p = subprocess.run(cmd, shell=True, capture_output=True)
-        res = p.stdout.decode()
-        if not res:
-            Log.write('Auth encryption ERROR: the OPENSSL may not be installed')
-        return quote_plus(res)
+        payload = cls._b64encode(decrypted.strip().encode('UTF-8'))
+        return quote_plus(f'{cls.TOKEN_VERSION}.{payload}.{cls._sign(payload)}')
 
-    @staticmethod
-    def decrypt(encrypted: str) -> Optional[str]:
+    @classmethod
+    def decrypt(cls, encrypted: str) -> Optional[str]:
         if not encrypted:
             return
-        cmd = (
-            f'echo "{unquote_plus(encrypted)}" | '
-            f'openssl enc -d -base64 -aes-256-cbc -k "{Config.encryption_key}" -pbkdf2')
-        p = subprocess.run(cmd, shell=True, capture_output=True)
+        with cls._lock:
+            if encrypted in cls._cache:
+                cls._cache.move_to_end(encrypted)
+                return cls._cache[encrypted]
+
+        decrypted = cls._verify(unquote_plus(encrypted))
+        if decrypted != Config.master_cam_hash and decrypted not in Config.cameras:
+            decrypted = None
+
+        with cls._lock:
+            cls._cache[encrypted] = decrypted
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return decrypted
+
+    @classmethod
+    def _verify(cls, token: str) -> Optional[str]:
+        parts = token.split('.')
+        if len(parts) != 3 or parts[0] != cls.TOKEN_VERSION:
+            return cls._decrypt_legacy(token)
         try:
-            decrypted = p.stdout.decode().strip()
-            if decrypted != Config.master_cam_hash and decrypted not in Config.cameras:
+            if not hmac.compare_digest(parts[2].encode('UTF-8'), cls._sign(parts[1]).encode('ascii')):
                 return
-            return decrypted
+            return cls._b64decode(parts[1]).decode('UTF-8')
+        except (ValueError, UnicodeError, TypeError):
+            return  # garbage in the cookie
+
+    @classmethod
+    def init(cls) -> None:
+        """ Derive the signing key (the slow part), called on the server start
+        """
+        if not cls._key:
+            cls._key = hashlib.pbkdf2_hmac(
+                'sha256', Config.encryption_key.encode('UTF-8'), b'cams-pwa-auth', 100000)
+
+    @classmethod
+    def is_legacy(cls, encrypted: str) -> bool:
+        """ Old cookies are decrypted by the openssl subprocess
+        """
+        return not encrypted.startswith(f'{cls.TOKEN_VERSION}.')
+
+    @classmethod
+    def _sign(cls, payload: str) -> str:
+        cls.init()
+        return cls._b64encode(hmac.new(cls._key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    @staticmethod
+    def _b64encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def _b64decode(data: str) -> bytes:
+        return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+    @staticmethod
+    def _decrypt_legacy(token: str) -> Optional[str]:
+        """ Cookies encrypted by openssl before the signed tokens
+        """
+        if not token.startswith('U2FsdGVk'):  # base64 "Salted__" header
+            return
+        cmd = ['openssl', 'enc', '-d', '-base64', '-aes-256-cbc', '-k', Config.encryption_key, '-pbkdf2']
+        p = subprocess.run(cmd, input=f'{token}\n'.encode(), capture_output=True)
+        Metrics.inc('cams_subprocesses_total', {'source': 'auth'})
+        try:
+            return p.stdout.decode().strip()
         except (Exception,):
+            Log.print('Auth: legacy cookie decryption ERROR')
             return
 
     @staticmethod
@@ -7,6 +7,8 @@ class Config:
     #    * "codecs": RFC 6381 information about video/audio codecs (part of Media Source type),
     #       for example: "hev1.1.6.L120.0" (H.265), "avc1.42E01E, mp4a.40.2" (H.264 with audio channel)
     #    * "storage_command": can overwrite common command (set UDP mode here, enable audio channel, etc.)
+    #    * "preview_command": can overwrite common preview command (use the camera substream here, etc.)
+    #    * "storage_quota_gb": optional, can overwrite common storage_quota_gb
     #    * "sensitivity" is used as threshold value for the Motion Detector.
     #       Must be more than 1. Set to 0 to disable.
     #
@@ -17,6 +19,7 @@ class Config:
             'name': 'Any camera name',
             'codecs': '',
             'storage_command': '',
+            'preview_command': '',
             'sensitivity': 1.5,
             'events': False,
         },
@@ -64,6 +67,11 @@ class Config:
     # and check logrotate rules,
     # or just run main.py script with root permissions
     log_file = '/var/log/cams-pwa/cams-pwa.log'
+    # Optional local rotation (log_file.1, log_file.2, ...) instead of logrotate, 0 to disable
+    log_max_size_mb = 0
+    log_backups = 3
+    # Profiles folder (&profile=1 requests, ?profiler=camera or SIGUSR1), the log folder + /profiles by default
+    profile_path = ''
 
     # Storage video files root folder
     # Attention!
@@ -83,7 +91,20 @@ class Config:
         '-segment_format_options movflags=frag_keyframe+empty_moov+default_base_moof '
         '-reset_timestamps 1 -strftime 1 {cam_path}/%Y-%m-%d/%H/%M/%S.mp4')
 
+    # Optional low quality live frames for the group pages (?video=live&quality=low), empty to disable.
+    # {url} = cameras.hash.url
+    # {preview_path} = storage_path/cameras.hash.folder/.preview.jpg, the frame is overwritten in place
+    # It's one more camera connection and ffmpeg process per camera, for example:
+    # preview_command = (
+    #     'ffmpeg -rtsp_transport tcp -i {url} -an -vf fps=1/2,scale=480:-2 -q:v 8 -v fatal '
+    #     '-f image2 -update 1 -atomic_writing 1 {preview_path}')
+    preview_command = ''
+
     storage_period_days = 3
+    # Storage size limits, GB (0 means no limit): per camera and for all the cameras.
+    # The oldest minutes are removed first, before the storage_period_days is reached.
+    storage_quota_gb = 0
+    storage_total_quota_gb = 0
     events_period_days = 30
 
     # Debug options
@@ -1,10 +1,12 @@
 import asyncio
-import re
+import os
 from datetime import datetime, timedelta
-from typing import List
+from typing import Optional
 import const
 from _config import Config
-from share import Share
+from images import Images
+from motions import Motions
+from metrics import Metrics
 from log import Log
 
 
@@ -16,44 +18,53 @@ class Events:
         self._cam_config = Config.cameras[self._hash]
         self._events_path = f'{Config.events_path}/{self._cam_config["folder"]}'
         self._last_event = ''
+        self._last_name = ''
+        self._images = Images.instance(self._hash)
         self._last_rotation_date = ''
-        self._root_folders = []
 
-    async def run(self) -> None:
-        """ Check camera events (motion detector) and rotate folders
+    async def check(self) -> None:
+        """ Check camera events (motion detector) and rotate folders, runs every CHECK_INTERVAL_SEC (see Supervisor)
         """
-        Log.write(f'Events: start handling {self._hash}')
-        while True:
-            await asyncio.sleep(self.CHECK_INTERVAL_SEC)
-            try:
-                await self._rotate()
-                await self._check()
-            except Exception as e:
-                Log.write(f"Events ERROR: can't handle {self._hash} ({repr(e)})")
+        await self._rotate()
+        await self._check()
 
     async def _check(self) -> None:
-        folders = await self._get_root_folders()
-        if not folders:
-            return
-        live_path = f'{self._events_path}/{folders[-1]}'
-
-        cmd = f'ls --full-time {live_path} | tail -1 | awk ' + "'{print $6,$7}'"
-        last_event_iso = await self._exec(cmd)
-        no_milliseconds = re.sub(r'\.[^.]+$', '', last_event_iso)
-        last_event_digits = re.sub(r'[^\d]', '', no_milliseconds)
-        if not last_event_digits:
+        last_event = await asyncio.get_event_loop().run_in_executor(None, self._get_last_event)
+        if not last_event:
             return
+        last_event_iso = last_event.strftime('%Y-%m-%d %H:%M:%S')
+        last_event_digits = last_event.strftime(const.DT_WEB_FORMAT)
         if self._last_event and last_event_digits <= self._last_event:
             return
 
-        Share.cam_motions[self._hash] = last_event_digits
-        if not self._last_event:
+        if not self._last_event:  # already happened event, save it without notification
+            Motions.publish(self._hash, last_event_digits, False)
             self._last_event = last_event_digits
             return
 
         self._last_event = last_event_digits
+        if not Motions.publish(self._hash, last_event_digits):
+            return
         Log.print(f'Events: motion detected: {last_event_iso} {self._hash}')
 
+    def _get_last_event(self) -> Optional[datetime]:
+        """ Modification time of the last live file.
+            The live folder is reread by the images index only when its mtime is changed,
+            so an idle camera costs two stat calls.
+        """
+        folders = self._images.get_folders()
+        if not folders:
+            return None
+        names, _sizes = self._images.get_files(folders[-1])
+        if not names or names[-1] == self._last_name:
+            return None
+        try:
+            mtime = os.stat(f'{self._events_path}/{folders[-1]}/{names[-1]}').st_mtime
+        except OSError:
+            return None
+        self._last_name = names[-1]
+        return datetime.fromtimestamp(mtime)
+
     async def _rotate(self) -> None:
         now_date = datetime.now().strftime(const.DT_ROOT_FORMAT)
         if self._last_rotation_date and self._last_rotation_date == now_date:
@@ -65,7 +76,7 @@ class Events:
         # Rotation
         yesterday_folder = (datetime.now() - timedelta(days=1)).strftime(const.DT_ROOT_FORMAT)
 
-        folders = await self._get_root_folders()
+        folders = self._images.get_folders()
         if not folders:
             return
         live_path = f'{self._events_path}/{folders[-1]}'
@@ -83,6 +94,7 @@ class Events:
         cmd = (
             f'mkdir -p {self._events_path}/{yesterday_folder} '
             f'&& mv {live_path}/* {self._events_path}/{yesterday_folder}')
+        Metrics.inc('cams_subprocesses_total', {'source': 'events'})
         p = await asyncio.create_subprocess_shell(cmd)
         await p.wait()
 
@@ -92,6 +104,7 @@ class Events:
         oldest_folder = (datetime.now() - timedelta(days=Config.events_period_days)).strftime(const.DT_ROOT_FORMAT)
 
         cmd = f'ls -d {self._events_path}/*'
+        Metrics.inc('cams_subprocesses_total', {'source': 'events'})
         p = await asyncio.create_subprocess_shell(
             cmd,
             stdout=asyncio.subprocess.PIPE,
@@ -105,20 +118,15 @@ class Events:
             if wd >= oldest_folder or not wd:
                 break
             cmd = f'rm -rf {self._events_path}/{wd}'
+            Metrics.inc('cams_subprocesses_total', {'source': 'events'})
             p = await asyncio.create_subprocess_shell(cmd)
             await p.wait()
 
             Log.write(f'Events cleanup: remove {self._hash} {wd}')
 
-    async def _get_root_folders(self) -> List[str]:
-        if self._root_folders:
-            return self._root_folders
-        cmd = f'ls {self._events_path}'
-        self._root_folders = (await self._exec(cmd)).splitlines()
-        return self._root_folders
-
     @staticmethod
     async def _exec(cmd) -> str:
+        Metrics.inc('cams_subprocesses_total', {'source': 'events'})
         p = await asyncio.create_subprocess_shell(
             cmd,
             stdout=asyncio.subprocess.PIPE,
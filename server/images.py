@@ -1,23 +1,48 @@
-import subprocess
-from typing import Tuple, List, Any, Dict
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Tuple, List, Any, Dict, FrozenSet
 import const
 from _config import Config
 
 
 class Images:
+    """ Events images index: sorted names and sizes of every folder, refreshed by the folder mtime.
+        Only new files are stat'ed, so the growing live folder is updated incrementally.
+        The folder mtime isn't changed by writing into a file, so the images that may still be uploaded
+        (empty or recently modified ones) are re-stat'ed on every read until they settle.
+    """
+    UPLOAD_TIME = 10  # secs, an image modified more recently may still be uploaded
+    _instances = {}
+    _lock = threading.Lock()
+
     def __init__(self, camera_hash):
+        """ Use instance(), the object is shared by all the requests
+        """
         self._hash = camera_hash
         self._cam_config = Config.cameras[self._hash]
         self._events_path = f'{Config.events_path}/{self._cam_config["folder"]}'
-        self._root_folders = []
+        self._root_folders = (0.0, [])  # (mtime, folders), changed by the events rotation and cleanup
+        # folder: (mtime, names, sizes, names of the images to re-stat)
+        self._files: Dict[str, Tuple[float, List[str], List[int], FrozenSet[str]]] = {}
+
+    @classmethod
+    def instance(cls, camera_hash: str) -> 'Images':
+        if camera_hash not in cls._instances:
+            with cls._lock:
+                if camera_hash not in cls._instances:
+                    cls._instances[camera_hash] = cls(camera_hash)
+        return cls._instances[camera_hash]
 
     def get_chart_data(self) -> List[int]:
-        cnt = []
-        for folder in self._get_root_folders():
-            wd = f"{self._events_path}/{folder}"
-            cmd = f'ls {wd} | wc -l'
-            cnt.append(int(self._exec(cmd, 0)))
-        return cnt
+        return [len(self._get_files(folder)[0]) for folder in self._get_root_folders()]
+
+    def get_folders(self) -> List[str]:
+        return self._get_root_folders()
+
+    def get_files(self, folder: str) -> Tuple[List[str], List[int]]:
+        return self._get_files(folder)
 
     def get(self, args: Dict[str, List[Any]]) -> Tuple[str, int, str, int]:
         if args['image'][0] == 'next':
@@ -45,10 +70,10 @@ class Images:
 
         files = self._get_files(folders[folder_idx])
         if file_idx < 0:
-            file_idx = len(files) - 1
+            file_idx = len(files[0]) - 1
 
         # try to get file from current folder
-        if (step < 0 and abs(step) <= file_idx) or (0 < step <= len(files) - file_idx - 1):
+        if (step < 0 and abs(step) <= file_idx) or (0 < step <= len(files[0]) - file_idx - 1):
             file_idx += step
             return self._response(folders, files, folder_idx, file_idx)
 
@@ -69,20 +94,21 @@ class Images:
         return self._get_next(step, [folder_idx, file_idx])
 
     def _response(self, folders, files, folder_idx, file_idx) -> Tuple[str, int, str, int]:
+        names, sizes = files
         range_folder = const.MAX_RANGE / len(folders)
         folder_range = range_folder * folder_idx
 
-        range_file = range_folder / len(files)
+        range_file = range_folder / len(names)
         file_range = range_file * file_idx
 
         rng = round(folder_range + file_range)
-        if folder_idx >= len(folders) - 1 and file_idx >= len(files) - 1:
+        if folder_idx >= len(folders) - 1 and file_idx >= len(names) - 1:
             rng = const.MAX_RANGE + 1
         elif folder_idx <= 0 and file_idx <= 0:
             rng = -1
 
-        f = files[file_idx].split()
-        return f'{self._events_path}/{folders[folder_idx]}/{f[1]}', int(f[0]), f'{folder_idx}.{file_idx}', rng
+        path = f'{self._events_path}/{folders[folder_idx]}/{names[file_idx]}'
+        return path, sizes[file_idx], f'{folder_idx}.{file_idx}', rng
 
     def _get_by_range(self, rng: int, position: List[int]) -> Tuple[str, int, str, int]:
         rng = min(max(rng, 0), const.MAX_RANGE - 1)
@@ -92,7 +118,7 @@ class Images:
         folder_idx = int(rng / range_folder)
 
         files = self._get_files(folders[folder_idx])
-        file_idx = int((rng / range_folder - folder_idx) * len(files))
+        file_idx = int((rng / range_folder - folder_idx) * len(files[0]))
 
         if position[0] == folder_idx and position[1] == file_idx:  # save some traffic
             return '', 0, '', 0
@@ -110,30 +136,85 @@ class Images:
         if not folders:
             return '', 0, '', rng
         folder = folders[pos]
-        files = self._get_files(folder)
-        if not files and len(folders) > 1:  # fallback case
+        names, sizes = self._get_files(folder)
+        if not names and len(folders) > 1:  # fallback case
             folder = folders[-2]
-            files = self._get_files(folder)
+            names, sizes = self._get_files(folder)
+        if not names:
+            return '', 0, '', rng
 
-        f = files[pos].split()
-        path = f'{self._events_path}/{folder}/{f[1]}'
-        size = int(f[0])
-        return path, size, '', rng
+        return f'{self._events_path}/{folder}/{names[pos]}', sizes[pos], '', rng
 
     def _get_root_folders(self) -> List[str]:
-        if self._root_folders:
-            return self._root_folders
-        cmd = f'ls {self._events_path}'
-        self._root_folders = self._exec(cmd).splitlines()
-        return self._root_folders
-
-    def _get_files(self, folder: str) -> List[str]:
-        wd = f"{self._events_path}/{folder}"
-        cmd = f'ls -l {wd} | awk ' + "'{print $5,$9}'"
-        return self._exec(cmd).splitlines()
-
-    @staticmethod
-    def _exec(cmd: str, default: Any = '') -> Any:
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True, shell=True)
-        stdout, _stderr = p.communicate()
-        return stdout.strip() or default
+        try:
+            mtime = os.stat(self._events_path).st_mtime
+        except OSError:
+            return []
+        if self._root_folders[1] and self._root_folders[0] == mtime:
+            return self._root_folders[1]
+        try:
+            with os.scandir(self._events_path) as it:
+                folders = sorted(e.name for e in it if e.is_dir() and not e.name.startswith('.'))
+        except OSError:
+            folders = []
+        self._root_folders = (mtime, folders)
+        for folder in [f for f in self._files if f not in folders]:  # removed by the cleanup
+            self._files.pop(folder, None)
+        return folders
+
+    def _get_files(self, folder: str) -> Tuple[List[str], List[int]]:
+        """ Sorted file names and sizes of the folder
+        """
+        wd = f'{self._events_path}/{folder}'
+        try:
+            mtime = os.stat(wd).st_mtime
+        except OSError:
+            return [], []
+        cached = self._files.get(folder)
+        if cached and cached[0] == mtime:
+            if cached[3]:
+                return self._update_pending(folder, cached)
+            return cached[1], cached[2]
+
+        known = {n: s for n, s in zip(cached[1], cached[2]) if n not in cached[3]} if cached else {}
+        files, pending = [], set()
+        recent = time.time() - self.UPLOAD_TIME
+        try:
+            with os.scandir(wd) as it:
+                for e in it:
+                    if e.name in known:
+                        files.append((e.name, known[e.name]))
+                    elif e.is_file():
+                        try:
+                            stat = e.stat()
+                        except OSError:
+                            continue  # removed meanwhile
+                        files.append((e.name, stat.st_size))
+                        if not stat.st_size or stat.st_mtime > recent:
+                            pending.add(e.name)
+        except OSError:
+            return [], []
+        files.sort()
+        names, sizes = [f[0] for f in files], [f[1] for f in files]
+        # replace, don't mutate: the lists can be read by other threads
+        self._files[folder] = (mtime, names, sizes, frozenset(pending))
+        return names, sizes
+
+    def _update_pending(self, folder: str, cached: Tuple[float, List[str], List[int], FrozenSet[str]]
+                        ) -> Tuple[List[str], List[int]]:
+        """ Re-stat the images that may still be uploaded
+        """
+        mtime, names, sizes, pending = cached
+        sizes = list(sizes)
+        still_pending = set()
+        recent = time.time() - self.UPLOAD_TIME
+        for name in pending:
+            try:
+                stat = os.stat(f'{self._events_path}/{folder}/{name}')
+            except OSError:
+                continue  # removed, the folder mtime is changed too
+            sizes[bisect_left(names, name)] = stat.st_size
+            if not stat.st_size or stat.st_mtime > recent:
+                still_pending.add(name)
+        self._files[folder] = (mtime, names, sizes, frozenset(still_pending))
+        return names, sizes
@@ -0,0 +1,61 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import Dict, List, Tuple
+
+
+class Inotify:
+    """ Minimal ctypes binding to the Linux inotify API (non-blocking descriptor)
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+
+    _EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+    _BUFFER_SIZE = 65536
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._paths: Dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self._paths[wd] = path
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        if self._paths.pop(wd, None) is not None:
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> List[Tuple[str, int, str]]:
+        """ Returns pending events as (watched path, mask, file name)
+        """
+        try:
+            data = os.read(self.fd, self._BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_IGNORED:
+                events.append((self._paths.pop(wd, ''), mask, name))
+            else:
+                events.append((self._paths.get(wd, ''), mask, name))
+        return events
+
+    def close(self) -> None:
+        self._paths = {}
+        os.close(self.fd)
@@ -1,9 +1,29 @@
+import atexit
+import os
+import queue
+import sys
+import threading
 import time
-from subprocess import Popen
+from typing import Optional, TextIO
 from _config import Config
 
 
 class Log:
+    """ The log file is written by one background thread: the callers only put the line into the queue.
+        Lines are appended in batches and flushed by size or time, local rotation is optional (log_max_size_mb).
+        If the file can't be written the lines go to stderr until it's reopened, the queue is bounded (the new lines
+        are dropped if the writer falls behind).
+    """
+    FLUSH_INTERVAL = 1.0  # secs
+    FLUSH_SIZE = 64 * 1024  # bytes
+    MAX_QUEUE = 10000  # lines
+    REOPEN_INTERVAL = 10  # secs
+
+    _queue = queue.Queue(MAX_QUEUE)
+    _dropped = 0
+    _thread: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
     @staticmethod
     def print(info) -> None:
         if Config.debug:
@@ -15,8 +35,109 @@ class Log:
         if host == '127.0.0.1':
             return
 
-        # No strict necessary to use system command here, but it's the easiest way
-        info = info.replace('"', '\\"')
-        text = f'{time.strftime("%Y-%m-%d %H:%M:%S")} {info}'
-        cmd = f'echo "{text}" >> {Config.log_file}'
-        Popen(cmd, shell=True)
+        if not Log._thread:
+            Log._start()
+        try:
+            Log._queue.put_nowait((time.time(), info))
+        except queue.Full:
+            Log._dropped += 1
+
+    @classmethod
+    def _start(cls) -> None:
+        with cls._lock:
+            if cls._thread:
+                return
+            cls._thread = threading.Thread(target=cls._writer, name='log', daemon=True)
+            cls._thread.start()
+            atexit.register(cls._stop)
+
+    @classmethod
+    def _stop(cls) -> None:
+        """ Write the rest of the queue on exit
+        """
+        try:
+            cls._queue.put(None, timeout=5)
+        except queue.Full:
+            return
+        cls._thread.join(5)
+
+    @classmethod
+    def _writer(cls) -> None:
+        file = cls._open()
+        reopened = time.monotonic()
+        size = 0  # not flushed
+        flushed = time.monotonic()
+        while True:
+            try:
+                item = cls._queue.get(timeout=cls.FLUSH_INTERVAL)
+            except queue.Empty:
+                item = ''
+            if not file and time.monotonic() - reopened >= cls.REOPEN_INTERVAL:
+                file = cls._open()
+                reopened = time.monotonic()
+
+            lines = []
+            if cls._dropped:
+                dropped, cls._dropped = cls._dropped, 0
+                lines.append((time.time(), f'Log: ERROR: {dropped} lines dropped, the queue is full'))
+            if item:
+                lines.append(item)
+            for created, info in lines:
+                line = f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))} {info.strip()}\n'
+                size += len(line)
+                if file:
+                    try:
+                        file.write(line)
+                    except OSError as e:
+                        file = cls._close(file, e)
+                if not file:
+                    sys.stderr.write(line)
+
+            if item is None or size >= cls.FLUSH_SIZE or (size and time.monotonic() - flushed >= cls.FLUSH_INTERVAL):
+                if file:
+                    try:
+                        file.flush()
+                        file = cls._rotate(file)
+                    except OSError as e:
+                        file = cls._close(file, e)
+                size = 0
+                flushed = time.monotonic()
+            if item is None:
+                return
+
+    @staticmethod
+    def _close(file: TextIO, e: OSError) -> None:
+        """ Give up the failed file, it's reopened in REOPEN_INTERVAL
+        """
+        sys.stderr.write(f'*** Log: ERROR: can\'t write {Config.log_file} ({repr(e)}) ***\n')
+        try:
+            file.close()
+        except OSError:
+            pass  # the buffer can't be flushed too
+        return None
+
+    @staticmethod
+    def _open() -> Optional[TextIO]:
+        try:
+            return open(Config.log_file, 'a', buffering=Log.FLUSH_SIZE)
+        except OSError as e:
+            print(f"*** Log: ERROR: can't open {Config.log_file} ({repr(e)}) ***")
+            return None
+
+    @staticmethod
+    def _rotate(file: TextIO) -> Optional[TextIO]:
+        """ Rename log to log.1, log.1 to log.2, etc. if the log is larger than log_max_size_mb
+        """
+        max_size = getattr(Config, 'log_max_size_mb', 0) * 1024 * 1024
+        if not max_size or file.tell() < max_size:
+            return file
+        file.close()
+        backups = getattr(Config, 'log_backups', 3)
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists(f'{Config.log_file}.{i}'):
+                os.replace(f'{Config.log_file}.{i}', f'{Config.log_file}.{i + 1}')
+        if backups:
+            os.replace(Config.log_file, f'{Config.log_file}.1')
+        else:
+            os.remove(Config.log_file)
+        return Log._open()
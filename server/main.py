@@ -1,8 +1,11 @@
 import asyncio
-from threading import Thread
+import signal
 from _config import Config
 from storage import Storage
 from events import Events
+from sprites import Sprites
+from supervisor import Supervisor
+from profiler import Profiler
 import web
 
 
@@ -11,8 +14,7 @@ async def main() -> None:
 
     if Config.web_enabled:
         # Start one listener for all web clients
-        thread = Thread(target=web.Server.run)
-        thread.start()
+        tasks.append(asyncio.create_task(web.Server.run()))
 
     for camera_hash in Config.cameras.keys():
         if Config.storage_enabled:
@@ -20,14 +22,22 @@ async def main() -> None:
             await asyncio.sleep(0.1)
             s = Storage(camera_hash)
             tasks.append(asyncio.create_task(s.run()))
-            await asyncio.sleep(0.1)
-            tasks.append(asyncio.create_task(s.watchdog()))
+            Supervisor.add('storage', camera_hash, s.check, Config.min_segment_duration)
+            Supervisor.add('recorder', camera_hash, s.check_recorder, Config.min_segment_duration, s.get_status)
+            Supervisor.add('preview', camera_hash, s.check_preview, Config.min_segment_duration)
+            Supervisor.add('retention', camera_hash, s.check_retention, Config.min_segment_duration)
 
         if Config.events_enabled and Config().cameras[camera_hash]['events']:
-            # Events checking & rotation
-            await asyncio.sleep(0.01)
+            # Events checking & rotation, timeline thumbnails
             e = Events(camera_hash)
-            tasks.append(asyncio.create_task(e.run()))
+            Supervisor.add('events', camera_hash, e.check, Events.CHECK_INTERVAL_SEC)
+            Supervisor.add('sprites', camera_hash, Sprites.instance(camera_hash).check, Sprites.CHECK_INTERVAL)
+
+    # Toggle the camera jobs profiling for all the cameras: kill -USR1 <pid>
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, Profiler.toggle)
+
+    # All the periodic checks
+    tasks.append(asyncio.create_task(Supervisor.run()))
 
     for t in tasks:
         await t
@@ -0,0 +1,97 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Tuple, List, Callable, Iterable, Any
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """ In-process counters, gauges and histograms rendered in the Prometheus text format (see ?metrics).
+        Collectors add the values owned by other modules (traffic, recorders, waiters) at render time.
+    """
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    _types: Dict[str, Tuple[str, str]] = {  # name: (type, help)
+        'cams_requests_seconds': ('histogram', 'HTTP request handling time by route'),
+        'cams_steps_seconds': ('histogram', 'Hot path steps time (auth, executor jobs, file sending)'),
+        'cams_subprocesses_total': ('counter', 'Started subprocesses by source'),
+        'cams_live_waiters': ('gauge', 'Live video requests waiting for the next segment'),
+        'cams_bell_waiters': ('gauge', 'Motion subscribers (event streams and long polls)'),
+        'cams_sent_bytes_total': ('counter', 'Bytes of files served by camera'),
+        'cams_recorder_segment_age_seconds': ('gauge', 'Age of the last finished segment'),
+        'cams_recorder_restarts_total': ('counter', 'Recorder restarts by the watchdog'),
+        'cams_recorder_freezes_total': ('counter', 'Recorder freeze detections'),
+        'cams_storage_bytes': ('gauge', 'Storage size counted by the retention'),
+        'cams_job_healthy': ('gauge', 'Supervisor job health (1 is healthy)'),
+        'cams_job_failures': ('gauge', 'Supervisor job consecutive failures'),
+        'cams_job_duration_seconds': ('gauge', 'Supervisor job last run duration'),
+    }
+    _values: Dict[str, Dict[Labels, float]] = {}
+    _histograms: Dict[str, Dict[Labels, List[float]]] = {}  # labels: [bucket counts..., sum, count]
+    _collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def inc(cls, name: str, labels: Dict[str, str] = None, value: float = 1) -> None:
+        key = tuple(sorted(labels.items())) if labels else ()
+        with cls._lock:
+            values = cls._values.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, labels: Dict[str, str], seconds: float) -> None:
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            histogram = cls._histograms.setdefault(name, {}).get(key)
+            if not histogram:
+                histogram = [0] * (len(cls.BUCKETS) + 2)
+                cls._histograms[name][key] = histogram
+            histogram[bisect_left(cls.BUCKETS, seconds)] += 1  # the last bucket is +Inf
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    @classmethod
+    def add_collector(cls, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]) -> None:
+        """ collector() yields (name, labels, value) on every render
+        """
+        cls._collectors.append(collector)
+
+    @classmethod
+    def render(cls) -> str:
+        with cls._lock:
+            values = {name: dict(rows) for name, rows in cls._values.items()}
+            histograms = {name: {k: list(v) for k, v in rows.items()} for name, rows in cls._histograms.items()}
+        for collector in cls._collectors:
+            for name, labels, value in collector():
+                values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+        lines = []
+        for name, (metric_type, description) in cls._types.items():
+            if name not in values and name not in histograms:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in sorted(values.get(name, {}).items()):
+                lines.append(f'{name}{cls._format_labels(labels)} {cls._format_value(value)}')
+            for labels, histogram in sorted(histograms.get(name, {}).items()):
+                total = 0
+                for bound, count in zip(cls.BUCKETS + ('+Inf',), histogram):
+                    total += count
+                    lines.append(f'{name}_bucket{cls._format_labels(labels + (("le", str(bound)),))} {total}')
+                lines.append(f'{name}_sum{cls._format_labels(labels)} {cls._format_value(histogram[-2])}')
+                lines.append(f'{name}_count{cls._format_labels(labels)} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _format_labels(labels: Labels) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{Metrics._escape(v)}"' for k, v in labels) + '}'
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        return str(round(value, 6)) if isinstance(value, float) else str(value)
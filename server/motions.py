@@ -0,0 +1,45 @@
+import asyncio
+from typing import Set
+from share import Share
+
+
+class Motions:
+    """ Motion events bus. Publishers are the storage and events checkers, subscribers are the web clients.
+        Everything runs on the main event loop, so no locks are needed.
+    """
+    QUEUE_SIZE = 64  # events above it are dropped for the slow subscriber
+
+    _subscribers: Set[asyncio.Queue] = set()
+
+    @classmethod
+    def publish(cls, cam_hash: str, date_time: str, notify: bool = True) -> bool:
+        """ Save the camera last motion time and fan it out to the subscribers.
+            Returns False if the motion isn't newer than the saved one.
+        """
+        if cam_hash in Share.cam_motions and Share.cam_motions[cam_hash] >= date_time:
+            return False
+        Share.cam_motions[cam_hash] = date_time
+        if not notify:
+            return True
+        for queue in cls._subscribers:
+            try:
+                queue.put_nowait((cam_hash, date_time))
+            except asyncio.QueueFull:
+                pass
+        return True
+
+    @classmethod
+    def subscribe(cls) -> asyncio.Queue:
+        """ Queue of (cam hash, date time) motions, call unsubscribe() when done
+        """
+        queue = asyncio.Queue(cls.QUEUE_SIZE)
+        cls._subscribers.add(queue)
+        return queue
+
+    @classmethod
+    def unsubscribe(cls, queue: asyncio.Queue) -> None:
+        cls._subscribers.discard(queue)
+
+    @classmethod
+    def count(cls) -> int:
+        return len(cls._subscribers)
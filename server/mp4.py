@@ -0,0 +1,136 @@
+import os
+import struct
+from typing import Dict, List, Iterator, Tuple, Optional
+
+
+class Mp4:
+    """ Joins the fragmented MP4 segments (movflags=frag_keyframe+empty_moov+default_base_moof) into one stream:
+        ftyp and moov of the first segment, then moof and mdat of every segment with the fragment sequence numbers
+        (mfhd) and decode times (tfdt) made continuous. The sample data offsets are relative to moof
+        (default_base_moof), so the boxes are copied as is otherwise.
+        One object is one stream, the segments are fed in order by add().
+    """
+    HEADER = struct.Struct('>I4s')
+    UINT32 = struct.Struct('>I')
+    UINT64 = struct.Struct('>Q')
+
+    def __init__(self):
+        self._sequence = 0
+        self._signature: Optional[bytes] = None  # sample descriptions of the first segment
+        self._durations: Dict[int, int] = {}  # track id: default sample duration (trex)
+        self._offsets: Dict[int, int] = {}  # track id: decode time of the next segment start
+
+    def read(self, path: str) -> List[memoryview]:
+        with open(path, 'rb') as file:
+            data = bytearray(os.fstat(file.fileno()).st_size)
+            length = file.readinto(data)
+        return self.add(data if length == len(data) else data[:length])
+
+    def add(self, data: bytearray) -> List[memoryview]:
+        """ Stream chunks of the segment, empty if the segment can't be joined (other codec parameters)
+        """
+        boxes = list(self._iter_boxes(data, 0, len(data)))
+        moov = next(((start, end) for name, start, end in boxes if name == b'moov'), None)
+        stsd = self._find(data, moov, (b'trak', b'mdia', b'minf', b'stbl', b'stsd')) if moov else []
+        signature = b''.join(bytes(data[start:end]) for start, end in stsd)
+        first = self._signature is None
+        if first:
+            self._signature = signature
+            if moov:
+                self._read_defaults(data, moov)
+        elif signature and signature != self._signature:
+            return []
+
+        bases: Dict[int, int] = {}  # track id: the first decode time of the segment
+        ends: Dict[int, int] = {}
+        chunks = []
+        view = memoryview(data)
+        for i, (name, start, end) in enumerate(boxes):
+            if name in (b'ftyp', b'moov') and first:
+                chunks.append(view[start:end])
+            elif name == b'moof' and i + 1 < len(boxes) and boxes[i + 1][0] == b'mdat':
+                self._rewrite_moof(data, start, end, bases, ends)
+                mdat_end = boxes[i + 1][2]
+                chunks.append(view[start:mdat_end])
+        for track_id, end in ends.items():
+            self._offsets[track_id] = end
+        return chunks
+
+    def _rewrite_moof(self, data: bytearray, start: int, end: int, bases: Dict[int, int], ends: Dict[int, int]) -> None:
+        for name, box_start, box_end in self._iter_boxes(data, start + 8, end):
+            if name == b'mfhd':
+                self._sequence += 1
+                self.UINT32.pack_into(data, box_start + 12, self._sequence)
+            elif name == b'traf':
+                self._rewrite_traf(data, box_start, box_end, bases, ends)
+
+    def _rewrite_traf(self, data: bytearray, start: int, end: int, bases: Dict[int, int], ends: Dict[int, int]) -> None:
+        track_id, default_duration = 0, 0
+        tfdt = None
+        duration = 0
+        for name, box_start, box_end in self._iter_boxes(data, start + 8, end):
+            if name in (b'tfhd', b'trun'):
+                flags = self.UINT32.unpack_from(data, box_start + 8)[0] & 0xffffff
+            if name == b'tfhd':
+                track_id = self.UINT32.unpack_from(data, box_start + 12)[0]
+                position = box_start + 16 + (8 if flags & 0x01 else 0) + (4 if flags & 0x02 else 0)
+                default_duration = self.UINT32.unpack_from(data, position)[0] if flags & 0x08 else \
+                    self._durations.get(track_id, 0)
+            elif name == b'tfdt':
+                tfdt = box_start
+            elif name == b'trun':
+                duration += self._get_trun_duration(data, box_start, flags, default_duration)
+        if tfdt is None:
+            return
+
+        version = data[tfdt + 8]
+        field = self.UINT64 if version == 1 else self.UINT32
+        decode_time = field.unpack_from(data, tfdt + 12)[0]
+        base = bases.setdefault(track_id, decode_time)
+        decode_time = decode_time - base + self._offsets.get(track_id, 0)
+        if version != 1:
+            decode_time &= 0xffffffff  # ffmpeg writes the 64 bits version, the limit is 13 hours for 90 kHz
+        field.pack_into(data, tfdt + 12, decode_time)
+        ends[track_id] = max(ends.get(track_id, 0), decode_time + duration)
+
+    def _get_trun_duration(self, data: bytearray, start: int, flags: int, default_duration: int) -> int:
+        count = self.UINT32.unpack_from(data, start + 12)[0]
+        if not flags & 0x100:
+            return count * default_duration
+        position = start + 16 + (4 if flags & 0x01 else 0) + (4 if flags & 0x04 else 0)
+        sample_size = 4 * bin(flags & 0xf00).count('1')
+        return sum(self.UINT32.unpack_from(data, position + i * sample_size)[0] for i in range(count))
+
+    def _read_defaults(self, data: bytearray, moov: Tuple[int, int]) -> None:
+        for start, _end in self._find(data, moov, (b'mvex', b'trex')):
+            track_id, _description, duration = struct.unpack_from('>III', data, start + 12)
+            self._durations[track_id] = duration
+
+    def _find(self, data: bytearray, parent: Tuple[int, int], path: Tuple[bytes, ...]) -> Iterator[Tuple[int, int]]:
+        """ (start, end) of the boxes by the path of names below the parent box
+        """
+        for name, start, end in self._iter_boxes(data, parent[0] + 8, parent[1]):
+            if name != path[0]:
+                continue
+            if len(path) == 1:
+                yield start, end
+            else:
+                yield from self._find(data, (start, end), path[1:])
+
+    @classmethod
+    def _iter_boxes(cls, data: bytearray, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+        """ (name, start, end) of the boxes between the offsets, the truncated last box is skipped
+        """
+        position = start
+        while position + 8 <= end:
+            size, name = cls.HEADER.unpack_from(data, position)
+            if size == 1:
+                if position + 16 > end:
+                    return
+                size = cls.UINT64.unpack_from(data, position + 8)[0]
+            elif size == 0:
+                size = end - position  # up to the end
+            if size < 8 or position + size > end:
+                return
+            yield name, position, position + size
+            position += size
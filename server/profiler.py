@@ -0,0 +1,116 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Dict
+from _config import Config
+from log import Log
+
+
+class Profiler:
+    """ Opt-in cProfile hooks, nothing is wrapped while they are off:
+        - master request with &profile=1 is profiled as a whole;
+        - camera ticks (see Supervisor) are profiled for a while after ?profiler=camera&hash=<cam hash>,
+          SIGUSR1 toggles it for all the cameras.
+        Results are saved to the rotating profile_path folder, ?profiler=summary shows the top functions.
+        The event loop thread is profiled, so concurrent requests get into the profile too,
+        the overlapping runs aren't profiled separately (they are counted in the log).
+    """
+    SECONDS = 60  # camera profiling duration
+    MAX_FILES = 50
+    TOP = 30
+    ALL = '*'
+
+    _cameras: Dict[str, float] = {}  # camera hash (or ALL): profile until, monotonic
+    _active = False  # only one cProfile can be enabled on the thread
+    _skipped = 0  # runs started while another one was profiled
+
+    @classmethod
+    async def profile(cls, name: str, coro: Awaitable) -> Any:
+        if cls._active:
+            cls._skipped += 1
+            return await coro
+        cls._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            cls._active = False
+            skipped, cls._skipped = cls._skipped, 0
+            if skipped:
+                Log.write(f'Profiler: {skipped} runs skipped while profiling {name}')
+            await asyncio.get_event_loop().run_in_executor(None, cls._save, name, profile)
+
+    @classmethod
+    def is_enabled(cls, cam_hash: str) -> bool:
+        if not cls._cameras:
+            return False
+        now = time.monotonic()
+        for key in [k for k, until in cls._cameras.items() if until < now]:
+            cls._cameras.pop(key)
+            Log.write(f'Profiler: stop {key}')
+        return cam_hash in cls._cameras or cls.ALL in cls._cameras
+
+    @classmethod
+    def enable(cls, cam_hash: str = ALL, seconds: float = SECONDS) -> None:
+        cls._cameras[cam_hash] = time.monotonic() + seconds
+        Log.write(f'Profiler: start {cam_hash} for {seconds}s')
+
+    @classmethod
+    def toggle(cls) -> None:
+        """ Signal handler
+        """
+        if cls.ALL in cls._cameras:
+            cls._cameras.pop(cls.ALL)
+            Log.write(f'Profiler: stop {cls.ALL}')
+        else:
+            cls.enable()
+
+    @classmethod
+    def summary(cls, name: str = '') -> str:
+        """ Top functions by the cumulative time of the saved profiles (their names contain the given string)
+        """
+        files = [f'{cls._get_path()}/{f}' for f in cls._get_files() if name in f]
+        if not files:
+            return 'No profiles\n'
+        stream = io.StringIO()
+        stats = pstats.Stats(files[0], stream=stream)
+        for file in files[1:]:
+            stats.add(file)
+        stream.write(f'{len(files)} profiles: {os.path.basename(files[0])} ... {os.path.basename(files[-1])}\n')
+        stats.files = []  # not the header of every file
+        stats.strip_dirs().sort_stats('cumulative').print_stats(cls.TOP)
+        return stream.getvalue()
+
+    @classmethod
+    def _save(cls, name: str, profile: cProfile.Profile) -> None:
+        """ Runs in the executor, not to block the profiled loop
+        """
+        path = cls._get_path()
+        try:
+            os.makedirs(path, exist_ok=True)
+            safe_name = re.sub(r'[^\w.-]+', '_', name)[:80]
+            profile.dump_stats(f'{path}/{datetime.now().strftime("%Y%m%d%H%M%S%f")}-{safe_name}.prof')
+            for file in cls._get_files()[:-cls.MAX_FILES]:
+                os.remove(f'{path}/{file}')
+        except OSError as e:
+            Log.write(f"Profiler: ERROR: can't save {name} ({repr(e)})")
+
+    @classmethod
+    def _get_files(cls):
+        try:
+            return sorted(f for f in os.listdir(cls._get_path()) if f.endswith('.prof'))
+        except OSError:
+            return []
+
+    @staticmethod
+    def _get_path() -> str:
+        if getattr(Config, 'profile_path', ''):
+            return Config.profile_path
+        return f'{os.path.dirname(Config.log_file)}/profiles'
@@ -0,0 +1,143 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+import const
+from _config import Config
+from segments import Segments
+from sizes import Sizes
+from log import Log
+
+
+class Retention:
+    """ Storage retention by age (storage_period_days) and by size (storage_quota_gb per camera,
+        storage_total_quota_gb for all the cameras).
+        The oldest minute folders are removed a few per check, so there are no I/O spikes of the whole day removal.
+        Camera bytes are counted once from the sizes files, then kept up to date by the storage side.
+    """
+    MAX_FOLDERS = 10  # minute folders removed per check
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cam_hash: str):
+        self._hash = cam_hash
+        self._cam_path = f'{Config.storage_path}/{Config.cameras[self._hash]["folder"]}'
+        self._segments = Segments.instance(self._hash)
+        self._sizes = Sizes.instance(self._hash)
+        self._bytes: Optional[int] = None  # counted on the first check
+        self._bytes_lock = threading.Lock()
+        self._oldest = ''  # oldest minute folder, used by the total quota
+
+    @classmethod
+    def instance(cls, cam_hash: str) -> 'Retention':
+        if cam_hash not in cls._instances:
+            with cls._lock:
+                if cam_hash not in cls._instances:
+                    cls._instances[cam_hash] = cls(cam_hash)
+        return cls._instances[cam_hash]
+
+    def add(self, size: int) -> None:
+        """ Count the new segment (called by the storage side)
+        """
+        with self._bytes_lock:
+            if self._bytes is not None:
+                self._bytes += size
+
+    def get_bytes(self) -> int:
+        return self._bytes or 0
+
+    def evict(self) -> int:
+        """ Remove the expired and over quota folders, returns the number of the removed ones
+        """
+        if self._bytes is None:
+            self._count()
+
+        removed = 0
+        trim = {}  # day: the first kept epoch
+        while removed < self.MAX_FOLDERS:
+            folder = self._get_oldest()
+            if not folder or not self._is_expired(folder):
+                break
+            self._remove(folder)
+            removed += 1
+            day = folder.split('/')[0]
+            trim[day] = int((datetime.strptime(folder, const.DT_PATH_FORMAT) + timedelta(minutes=1)).timestamp())
+
+        for day, epoch in trim.items():
+            if os.path.isdir(f'{self._cam_path}/{day}'):
+                self._sizes.trim(day, epoch)  # the motion search mustn't find removed segments
+        return removed
+
+    def _count(self) -> None:
+        total = 0
+        for day in self._segments.folders():
+            _epochs, sizes = self._sizes.get(day)
+            total += sum(sizes)
+        with self._bytes_lock:
+            self._bytes = total
+        Log.print(f'Retention: {self._hash} {round(total / 1024 ** 3, 3)} GB')
+
+    def _is_expired(self, folder: str) -> bool:
+        if self._is_mutable(folder):
+            return False
+        oldest_day = (datetime.now() - timedelta(days=Config.storage_period_days)).strftime(const.DT_ROOT_FORMAT)
+        if folder < oldest_day:
+            return True
+
+        cfg = Config.cameras[self._hash]
+        quota = cfg['storage_quota_gb'] if 'storage_quota_gb' in cfg else getattr(Config, 'storage_quota_gb', 0)
+        if quota and self.get_bytes() > quota * 1024 ** 3:
+            return True
+
+        total_quota = getattr(Config, 'storage_total_quota_gb', 0)
+        if not total_quota or sum(r.get_bytes() for r in self._instances.values()) <= total_quota * 1024 ** 3:
+            return False
+        # the camera with the oldest folder frees the space
+        return all(folder <= r._oldest for r in self._instances.values() if r is not self and r._oldest)
+
+    def _get_oldest(self) -> str:
+        """ Oldest minute folder, empty parents are removed on the way
+        """
+        self._oldest = ''
+        for day in self._segments.folders():
+            for hour in self._segments.folders(day):
+                minutes = self._segments.folders(f'{day}/{hour}')
+                if minutes:
+                    self._oldest = f'{day}/{hour}/{minutes[0]}'
+                    return self._oldest
+                self._remove_empty(f'{day}/{hour}')
+            self._remove_empty(day)
+        return ''
+
+    @staticmethod
+    def _is_mutable(folder: str) -> bool:
+        """ The folder (or its children) may still be written by the storage command
+        """
+        boundary = (datetime.now() - timedelta(minutes=Segments.MUTABLE_MINUTES)).strftime(const.DT_PATH_FORMAT)
+        return folder >= boundary[:len(folder)]
+
+    def _remove(self, folder: str) -> None:
+        _names, sizes = self._segments.scan(folder)  # not cached, the folder is removed
+        shutil.rmtree(f'{self._cam_path}/{folder}', ignore_errors=True)
+        self._segments.forget(folder)
+        with self._bytes_lock:
+            self._bytes = max(0, self.get_bytes() - sum(sizes))
+        Log.print(f'Retention: remove {self._hash} {folder}')
+
+    def _remove_empty(self, folder: str) -> bool:
+        if self._is_mutable(folder):
+            return False
+        try:
+            os.rmdir(f'{self._cam_path}/{folder}')
+        except OSError:
+            return False
+        if '/' not in folder:  # the whole day is removed
+            try:
+                os.remove(f'{self._cam_path}/{folder}{Sizes.EXT}')
+            except OSError:
+                pass
+            self._sizes.forget(folder)
+            Log.write(f'Storage: cleanup: remove {self._hash} {folder}')
+        return True
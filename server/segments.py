@@ -0,0 +1,166 @@
+import asyncio
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+import const
+from _config import Config
+
+
+class Segments:
+    """ In-memory index of the camera storage tree, shared by all requests.
+        Folders listings are refreshed by mtime, finished minute folders are read only once.
+    """
+    MUTABLE_MINUTES = 2  # the folders may still be written by the storage command
+    RECENT_LEN = 9  # used by the live motion detector
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cam_hash: str):
+        self._hash = cam_hash
+        self._cam_path = f'{Config.storage_path}/{Config.cameras[self._hash]["folder"]}'
+        self._folders: Dict[str, Tuple[float, List[str]]] = {}  # parent: (mtime, [sorted child folders])
+        self._files: Dict[str, Tuple[List[str], List[int]]] = {}  # minute folder: ([sorted names], [sizes])
+        self._last = ('', 0)  # last finished segment: (relative path, size)
+        self._recent = deque(maxlen=self.RECENT_LEN)
+        self._publish_lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        # Set by the storage watcher: finished segments are published, the live folders aren't rescanned
+        self.pushed = False
+
+    @classmethod
+    def instance(cls, cam_hash: str) -> 'Segments':
+        if cam_hash not in cls._instances:
+            with cls._lock:
+                if cam_hash not in cls._instances:
+                    cls._instances[cam_hash] = cls(cam_hash)
+        return cls._instances[cam_hash]
+
+    def folders(self, parent: str = '') -> List[str]:
+        """ Sorted child folders of the given parent ('' is the camera root)
+        """
+        path = f'{self._cam_path}/{parent}'.rstrip('/')
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._folders.pop(parent, None)
+            return []
+
+        cached = self._folders.get(parent)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with os.scandir(path) as it:
+                res = sorted(e.name for e in it if e.is_dir())
+        except OSError:
+            res = []
+        self._folders[parent] = (mtime, res)
+        if not parent:
+            self._forget_removed_days(res)
+        return res
+
+    def files(self, folder: str) -> Tuple[List[str], List[int]]:
+        """ Sorted file names and sizes of the minute folder
+        """
+        cached = self._files.get(folder)
+        if cached and (self.pushed or not self._is_mutable(folder)):
+            return cached
+
+        res = self.scan(folder)
+        self._files[folder] = res
+        return res
+
+    def publish(self, folder: str, name: str, size: int) -> None:
+        """ Add finished segment to the index (called by the storage side)
+        """
+        with self._publish_lock:
+            names, sizes = self._files[folder] if folder in self._files else self.scan(folder)
+            i = bisect_left(names, name)
+            if i < len(names) and names[i] == name:
+                sizes = sizes[:i] + [size] + sizes[i + 1:]
+            else:
+                names = names[:i] + [name] + names[i:]
+                sizes = sizes[:i] + [size] + sizes[i:]
+            self._files[folder] = (names, sizes)  # replace, don't mutate: the lists can be read by other threads
+
+            path = f'{folder}/{name}'
+            if path > self._last[0]:
+                self._last = (path, size)
+                self._recent.append((path, size))
+                waiters, self._waiters = self._waiters, []
+                for loop, future in waiters:
+                    loop.call_soon_threadsafe(self._wake, future)
+
+    async def wait(self, path: str, timeout: float) -> bool:
+        """ Wait until a segment newer than the given relative path is published
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        with self._publish_lock:
+            if self._last[0] > path:
+                return True
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def last(self) -> Tuple[str, int]:
+        """ Last published segment (relative path, size)
+        """
+        return self._last
+
+    def recent(self) -> List[Tuple[str, int]]:
+        """ Last published segments (relative path, size), oldest first
+        """
+        return list(self._recent)
+
+    def remove_empty(self, folder: str) -> None:
+        self._files.pop(folder, None)
+        try:
+            os.rmdir(f'{self._cam_path}/{folder}')
+        except OSError:
+            pass
+
+    def forget(self, folder: str) -> None:
+        """ Drop the removed folder, its parents and the days listings from the index
+        """
+        parts = folder.split('/')
+        with self._lock:
+            for key in list(self._files):
+                if key == folder or key.startswith(f'{folder}/'):
+                    self._files.pop(key, None)
+            for i in range(len(parts) + 1):
+                self._folders.pop('/'.join(parts[:i]), None)
+
+    def scan(self, folder: str) -> Tuple[List[str], List[int]]:
+        """ Read the minute folder from disk, bypassing the index
+        """
+        try:
+            with os.scandir(f'{self._cam_path}/{folder}') as it:
+                entries = sorted((e.name, e.stat().st_size) for e in it if e.is_file())
+        except OSError:
+            return [], []
+        return [e[0] for e in entries], [e[1] for e in entries]
+
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(True)
+
+    def _forget_removed_days(self, days: List[str]) -> None:
+        existing = set(days)
+        for key in list(self._files):
+            if key.split('/')[0] not in existing:
+                self._files.pop(key, None)
+        for key in list(self._folders):
+            if key and key.split('/')[0] not in existing:
+                self._folders.pop(key, None)
+
+    def _is_mutable(self, folder: str) -> bool:
+        return folder >= (datetime.now() - timedelta(minutes=self.MUTABLE_MINUTES)).strftime(const.DT_PATH_FORMAT)
@@ -1,2 +1,3 @@
 class Share:
     cam_motions = {}
+    cam_traffic = {}  # bytes served per camera
@@ -0,0 +1,155 @@
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Sequence, Tuple
+import const
+from _config import Config
+from segments import Segments
+
+
+class Sizes:
+    """ Persistent segment sizes of the camera, one <day>.sizes file next to each day folder.
+        The file is an append-only array of (epoch seconds, size) uint32 pairs in ascending epoch order.
+        It's appended by the storage side and memory-mapped for the motion search.
+    """
+    EXT = '.sizes'
+    TYPE = 'I'  # uint32
+    RECORD_SIZE = 8
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cam_hash: str):
+        self._hash = cam_hash
+        self._cam_path = f'{Config.storage_path}/{Config.cameras[self._hash]["folder"]}'
+        self._segments = Segments.instance(self._hash)
+        self._maps: Dict[str, Tuple[int, memoryview]] = {}  # day: (mapped length, uint32 view)
+        self._last: Dict[str, int] = {}  # day: last appended epoch
+        self._write_lock = threading.Lock()
+        # Set by the storage side: today's file is kept up to date, otherwise it's built on every read
+        self.pushed = False
+
+    @classmethod
+    def instance(cls, cam_hash: str) -> 'Sizes':
+        if cam_hash not in cls._instances:
+            with cls._lock:
+                if cam_hash not in cls._instances:
+                    cls._instances[cam_hash] = cls(cam_hash)
+        return cls._instances[cam_hash]
+
+    def append(self, folder: str, name: str, size: int) -> bool:
+        """ Save finished segment size (repeated and out of order segments are skipped)
+        """
+        epoch = self._get_epoch(folder, name)
+        day = folder.split('/')[0]
+        if not epoch or epoch <= self._last.get(day, 0):
+            return False
+        with self._write_lock:
+            self._last[day] = epoch
+            with open(self._get_path(day), 'ab') as file:
+                array(self.TYPE, (epoch, min(size, 0xFFFFFFFF))).tofile(file)
+        return True
+
+    def sync(self, day: str) -> None:
+        """ Rewrite the day file from the storage folders
+        """
+        epochs, sizes = self._build(day)
+        if not epochs and not os.path.isdir(f'{self._cam_path}/{day}'):
+            return
+        data = array(self.TYPE)
+        for epoch, size in zip(epochs, sizes):
+            data.append(epoch)
+            data.append(min(size, 0xFFFFFFFF))
+        path = self._get_path(day)
+        with self._write_lock:
+            with open(f'{path}.tmp', 'wb') as file:
+                data.tofile(file)
+            os.replace(f'{path}.tmp', path)
+            self._maps.pop(day, None)  # the same length would keep the replaced file mapped
+            self._last[day] = epochs[-1] if epochs else 0
+
+    def get(self, day: str) -> Tuple[Sequence[int], Sequence[int]]:
+        """ Epochs and sizes of the day segments
+        """
+        if day >= datetime.now().strftime(const.DT_ROOT_FORMAT) and not self.pushed:
+            return self._build(day, True)  # nobody appends today's file
+
+        path = self._get_path(day)
+        try:
+            length = os.stat(path).st_size
+        except OSError:
+            if day not in self._segments.folders():
+                return [], []
+            self.sync(day)
+            length = os.stat(path).st_size
+        length -= length % self.RECORD_SIZE  # the last record can be half-written
+
+        cached = self._maps.get(day)
+        if not cached or cached[0] != length:
+            if not length:
+                return [], []
+            with open(path, 'rb') as file:
+                view = memoryview(mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ)).cast(self.TYPE)
+            cached = (length, view)
+            self._maps[day] = cached
+        return cached[1][0::2], cached[1][1::2]
+
+    def trim(self, day: str, epoch: int) -> None:
+        """ Drop the records before the epoch (the folders are removed by the retention)
+        """
+        path = self._get_path(day)
+        with self._write_lock:
+            data = array(self.TYPE)
+            try:
+                with open(path, 'rb') as file:
+                    data.frombytes(file.read())
+            except OSError:
+                return
+            del data[len(data) - len(data) % 2:]  # the last record can be half-written
+            i = bisect_left(data[0::2], epoch) * 2
+            if not i:
+                return
+            with open(f'{path}.tmp', 'wb') as file:
+                data[i:].tofile(file)
+            os.replace(f'{path}.tmp', path)
+            self._maps.pop(day, None)
+
+    def forget(self, day: str) -> None:
+        """ Drop the removed day (see Storage cleanup)
+        """
+        self._maps.pop(day, None)
+        self._last.pop(day, None)
+
+    def _build(self, day: str, indexed: bool = False) -> Tuple[Sequence[int], Sequence[int]]:
+        """ Read the day sizes from the segments index (it caches the finished folders) or from disk
+        """
+        epochs, sizes = [], []
+        for hour in self._segments.folders(day):
+            for minute in self._segments.folders(f'{day}/{hour}'):
+                folder = f'{day}/{hour}/{minute}'
+                names, folder_sizes = self._segments.files(folder) if indexed else self._segments.scan(folder)
+                start_epoch = self._get_epoch(folder, '00') if names else 0
+                if not start_epoch:
+                    continue
+                for name, size in zip(names, folder_sizes):
+                    seconds = name.split('.')[0]
+                    if seconds.isdigit():
+                        epochs.append(start_epoch + int(seconds))
+                        sizes.append(size)
+        return epochs, sizes
+
+    def _get_path(self, day: str) -> str:
+        return f'{self._cam_path}/{day}{self.EXT}'
+
+    @staticmethod
+    def _get_epoch(folder: str, name: str) -> int:
+        seconds = name.split('.')[0]
+        if not seconds.isdigit():
+            return 0
+        try:
+            return int(datetime.strptime(folder, const.DT_PATH_FORMAT).timestamp()) + int(seconds)
+        except ValueError:
+            return 0
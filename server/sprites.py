@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Set, Tuple
+from _config import Config
+from images import Images
+from metrics import Metrics
+from log import Log
+
+
+class Sprites:
+    """ Thumbnails of the events images packed into one sheet per folder hour (by the file mtime).
+        Sheets are made by ffmpeg in the background, the events slider previews a whole hour with one request.
+        Every image is scaled once into a small thumbnail, a changed hour sheet is tiled from the thumbnails.
+        The sheets index is kept in memory (and in the json files for the restart), the folders are scanned
+        in the executor.
+    """
+    FOLDER = '.sprites'  # inside the camera events folder
+    THUMBS = '.thumbs'  # inside the sprites folder of the events folder
+    THUMB_WIDTH = 160
+    THUMB_HEIGHT = 90
+    COLUMNS = 10
+    MAX_CELLS = 100  # hours with more images are sampled evenly
+    CHECK_INTERVAL = 30
+    WORKERS = 2  # ffmpeg processes for all the cameras
+
+    _instances = {}
+    _lock = threading.Lock()
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    def __init__(self, camera_hash: str):
+        self._hash = camera_hash
+        self._events_path = f'{Config.events_path}/{Config.cameras[self._hash]["folder"]}'
+        self._sprites_path = f'{self._events_path}/{self.FOLDER}'
+        self._images = Images.instance(self._hash)
+        self._hours: Dict[str, Dict[str, str]] = {}  # folder: {file name: hour}
+        self._index: Dict[str, Dict[str, Dict[str, List[str]]]] = {}  # folder: {hour: {files, cells}}
+        self._failed = False
+
+    @classmethod
+    def instance(cls, camera_hash: str) -> 'Sprites':
+        if camera_hash not in cls._instances:
+            with cls._lock:
+                if camera_hash not in cls._instances:
+                    cls._instances[camera_hash] = cls(camera_hash)
+        return cls._instances[camera_hash]
+
+    async def check(self) -> Optional[bool]:
+        """ Make the sheets of the changed hours, runs every CHECK_INTERVAL (see Supervisor)
+        """
+        if not Sprites._semaphore:
+            Sprites._semaphore = asyncio.Semaphore(self.WORKERS)
+        try:
+            await self._update()
+        except FileNotFoundError as e:
+            if not self._failed:
+                Log.write(f'Sprites: ERROR: ffmpeg is not found for {self._hash} ({repr(e)})')
+            self._failed = True
+            return False  # backed off
+        self._failed = False
+        return True
+
+    def get_index(self, folder_idx: int) -> List[Dict[str, Any]]:
+        """ Sheets of the folder: hour, source url, covered file indexes and the indexes of the cells
+        """
+        folders = self._images.get_folders()
+        if not 0 <= folder_idx < len(folders):
+            return []
+        folder = folders[folder_idx]
+        names, _sizes = self._images.get_files(folder)
+
+        res = []
+        for hour, index in sorted(self._get_folder_index(folder).items()):
+            if not index['cells']:
+                continue
+            cells = [bisect_left(names, name) for name in index['cells']]
+            files = [bisect_left(names, name) for name in index['files']]
+            res.append({
+                'hour': hour,
+                'src': f'/?image=sprite&folder={folder_idx}&hour={hour}&hash={self._hash}',
+                'first': min(files),
+                'last': max(files),
+                'cells': cells,
+                'columns': self.COLUMNS,
+                'width': self.THUMB_WIDTH,
+                'height': self.THUMB_HEIGHT,
+            })
+        return res
+
+    def get_path(self, folder_idx: int, hour: str) -> str:
+        folders = self._images.get_folders()
+        if not 0 <= folder_idx < len(folders) or not hour.isdigit():
+            return ''
+        path = f'{self._sprites_path}/{folders[folder_idx]}/{hour}.jpg'
+        return path if os.path.isfile(path) else ''
+
+    async def _update(self) -> None:
+        loop = asyncio.get_event_loop()
+        jobs = await loop.run_in_executor(None, self._scan)
+        for folder, hour, files, cells, new in jobs:
+            async with Sprites._semaphore:
+                await self._make(folder, hour, files, cells, new)
+
+    def _scan(self) -> List[Tuple[str, str, List[str], List[str], List[str]]]:
+        """ Hours with the changed file lists: (folder, hour, files, cells, cells without thumbnails)
+        """
+        folders = self._images.get_folders()
+        self._remove_outdated(folders)
+
+        jobs = []
+        for folder in folders:
+            index = self._get_folder_index(folder)
+            hours = self._get_hours(folder)
+            for hour in [h for h in index if h not in hours]:  # the images are moved by the rotation
+                self._remove(f'{self._sprites_path}/{folder}/{hour}')
+            self._index[folder] = {h: v for h, v in index.items() if h in hours}  # replace, it's read by requests
+
+            thumbs = self._get_thumbs(folder, set(self._hours[folder]))
+            for hour, files in hours.items():
+                if index.get(hour, {}).get('files') == files:
+                    continue
+                step = max(1, len(files) / self.MAX_CELLS)
+                cells = [files[int(i * step)] for i in range(min(len(files), self.MAX_CELLS))]
+                jobs.append((folder, hour, files, cells, [name for name in cells if name not in thumbs]))
+        return jobs
+
+    async def _make(self, folder: str, hour: str, files: List[str], cells: List[str], new: List[str]) -> None:
+        """ Scale the new cells images into the thumbnails, then tile the sheet of the thumbnails
+        """
+        path = f'{self._sprites_path}/{folder}/{hour}'
+        thumbs_path = f'{self._sprites_path}/{folder}/{self.THUMBS}'
+        if new:
+            await self._run(os.makedirs, thumbs_path, 0o777, True)
+            if not await self._make_thumbs(folder, new):  # a broken image fails the batch
+                for name in new:
+                    await self._make_thumbs(folder, [name])
+            missing = await self._run(self._rename_thumbs, thumbs_path, new)
+            cells = [name for name in cells if name not in missing]
+            if not cells:  # not retried until the hour is changed
+                self._index[folder] = {**self._index.get(folder, {}), hour: {'files': files, 'cells': []}}
+                return
+
+        rows = (len(cells) - 1) // self.COLUMNS + 1
+        await self._run(self._write_list, f'{path}.txt', [f'{thumbs_path}/{name}' for name in cells])
+        try:
+            done = await self._ffmpeg(f'{folder}/{hour}', [
+                '-f', 'concat', '-safe', '0', '-i', f'{path}.txt',
+                '-vf', f'tile={self.COLUMNS}x{rows}', '-frames:v', '1', '-q:v', '5', f'{path}.tmp.jpg'])
+        finally:
+            await self._run(os.remove, f'{path}.txt')
+        if not done:
+            return
+        index = {'files': files, 'cells': cells}
+        await self._run(self._save, path, index)
+        self._index[folder] = {**self._index.get(folder, {}), hour: index}
+
+    async def _make_thumbs(self, folder: str, names: List[str]) -> bool:
+        """ One ffmpeg process for all the images, the thumbnails are written to the tmp names (see _rename_thumbs)
+        """
+        w, h = self.THUMB_WIDTH, self.THUMB_HEIGHT
+        thumbs_path = f'{self._sprites_path}/{folder}/{self.THUMBS}'
+        args = []
+        for name in names:
+            args += ['-i', f'{self._events_path}/{folder}/{name}']
+        for i, name in enumerate(names):
+            args += ['-map', f'{i}:v', '-vf', f'scale={w}:{h}:force_original_aspect_ratio=decrease,'
+                                              f'pad={w}:{h}:(ow-iw)/2:(oh-ih)/2',
+                     '-frames:v', '1', '-q:v', '5', f'{thumbs_path}/{name}.tmp.jpg']
+        return await self._ffmpeg(f'{folder} thumbnails', args)
+
+    async def _ffmpeg(self, name: str, args: List[str]) -> bool:
+        p = await asyncio.create_subprocess_exec('ffmpeg', '-v', 'error', '-y', *args, stderr=asyncio.subprocess.PIPE)
+        Metrics.inc('cams_subprocesses_total', {'source': 'sprites'})
+        _stdout, stderr = await p.communicate()
+        if p.returncode:
+            Log.print(f'Sprites: ffmpeg ERROR {self._hash} {name}: {stderr.decode().strip()}')
+        return not p.returncode
+
+    @staticmethod
+    async def _run(func, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _write_list(list_path: str, sources: List[str]) -> None:
+        with open(list_path, 'w') as file:
+            for source in sources:
+                quoted = source.replace("'", "'\\''")
+                file.write(f"file '{quoted}'\n")
+
+    @staticmethod
+    def _rename_thumbs(thumbs_path: str, names: List[str]) -> Set[str]:
+        """ Returns the names without the thumbnails (broken images)
+        """
+        missing = set()
+        for name in names:
+            try:
+                os.replace(f'{thumbs_path}/{name}.tmp.jpg', f'{thumbs_path}/{name}')
+            except OSError:
+                missing.add(name)
+        return missing
+
+    @staticmethod
+    def _save(path: str, index: Dict[str, List[str]]) -> None:
+        os.replace(f'{path}.tmp.jpg', f'{path}.jpg')
+        with open(f'{path}.tmp.json', 'w') as file:
+            json.dump(index, file)
+        os.replace(f'{path}.tmp.json', f'{path}.json')
+
+    def _get_hours(self, folder: str) -> Dict[str, List[str]]:
+        """ Sorted file names of the folder by the hour of the file mtime, only the new files are stat'ed
+        """
+        names, _sizes = self._images.get_files(folder)
+        known = self._hours.get(folder, {})
+        hours = {}
+        res: Dict[str, List[str]] = {}
+        for name in names:
+            hour = known.get(name)
+            if not hour:
+                try:
+                    hour = datetime.fromtimestamp(os.stat(f'{self._events_path}/{folder}/{name}').st_mtime).strftime('%H')
+                except OSError:
+                    continue
+            hours[name] = hour
+            res.setdefault(hour, []).append(name)
+        self._hours[folder] = hours
+        return res
+
+    def _get_thumbs(self, folder: str, names: Set[str]) -> Set[str]:
+        """ Existing thumbnails of the folder, the ones of the moved images are removed
+        """
+        thumbs_path = f'{self._sprites_path}/{folder}/{self.THUMBS}'
+        try:
+            thumbs = set(os.listdir(thumbs_path))
+        except OSError:
+            return set()
+        for name in thumbs - names:
+            try:
+                os.remove(f'{thumbs_path}/{name}')
+            except OSError:
+                pass
+        return thumbs & names
+
+    def _get_folder_index(self, folder: str) -> Dict[str, Dict[str, List[str]]]:
+        """ Sheets of the folder by hour, read from the json files once
+        """
+        index = self._index.get(folder)
+        if index is None:
+            index = {}
+            for hour in self._get_hours_done(folder):
+                hour_index = self._read_index(folder, hour)
+                if hour_index:
+                    index[hour] = hour_index
+            self._index[folder] = index
+        return index
+
+    def _get_hours_done(self, folder: str) -> List[str]:
+        try:
+            return sorted(name[:-5] for name in os.listdir(f'{self._sprites_path}/{folder}') if name.endswith('.json')
+                          and not name.endswith('.tmp.json'))
+        except OSError:
+            return []
+
+    def _read_index(self, folder: str, hour: str) -> Optional[Dict[str, List[str]]]:
+        try:
+            with open(f'{self._sprites_path}/{folder}/{hour}.json') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_outdated(self, folders: List[str]) -> None:
+        """ Remove the sheets of the folders removed by the events cleanup
+        """
+        try:
+            existing = os.listdir(self._sprites_path)
+        except OSError:
+            return
+        for folder in existing:
+            if folder not in folders:
+                shutil.rmtree(f'{self._sprites_path}/{folder}', ignore_errors=True)
+                self._hours.pop(folder, None)
+                self._index.pop(folder, None)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        for ext in ('.jpg', '.json'):
+            try:
+                os.remove(f'{path}{ext}')
+            except OSError:
+                pass
@@ -0,0 +1,61 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, NamedTuple, Optional
+from _config import Config
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+class StaticFile(NamedTuple):
+    content: bytes
+    gzip: bytes  # empty if compression is useless
+    mime_type: str
+    etag: str
+    mtime: float
+
+
+class Static:
+    """ Client files loaded into memory once, with precompressed variants
+    """
+    CLIENT_PATH = os.path.realpath(f'{os.path.dirname(os.path.realpath(__file__))}/../client')
+    COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/manifest+json', 'image/svg+xml')
+    MANIFEST = '/cams.webmanifest'
+
+    _files: Dict[str, StaticFile] = {}
+
+    @classmethod
+    def load(cls) -> None:
+        files = {}
+        for root, _dirs, names in os.walk(cls.CLIENT_PATH):
+            for name in names:
+                path = f'{root}/{name}'[len(cls.CLIENT_PATH):]
+                with open(f'{cls.CLIENT_PATH}{path}', 'rb') as file:
+                    content = file.read()
+                    mtime = os.fstat(file.fileno()).st_mtime
+                if path == cls.MANIFEST:  # rendered for each client type, see get()
+                    for client_type, title in (('local', Config.title), ('web', Config.web_title)):
+                        files[f'{path}:{client_type}'] = cls._create(
+                            path, content.replace('{title}'.encode('UTF-8'), title.encode('UTF-8')), mtime)
+                else:
+                    files[path] = cls._create(path, content, mtime)
+        cls._files = files
+
+    @classmethod
+    def get(cls, path: str, client_type: str) -> Optional[StaticFile]:
+        if path == cls.MANIFEST:
+            path = f'{path}:{client_type}'
+        return cls._files.get(path)
+
+    @classmethod
+    def _create(cls, path: str, content: bytes, mtime: float) -> StaticFile:
+        mime_type, _enc = mimetypes.guess_type(path)
+        mime_type = mime_type or 'application/octet-stream'
+        compressed = b''
+        if mime_type.startswith(cls.COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(content, 9, mtime=0)
+            if len(compressed) > len(content) * 0.9:
+                compressed = b''
+        etag = f'"{hashlib.sha1(content).hexdigest()[:16]}"'
+        return StaticFile(content, compressed, mime_type, etag, mtime)
@@ -1,27 +1,55 @@
 import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Tuple, Callable, Any, Optional, Dict
 import const
 from _config import Config
 from videos import Videos
-from share import Share
+from segments import Segments
+from sizes import Sizes
+from retention import Retention
+from inotify import Inotify
+from motions import Motions
+from metrics import Metrics
 from log import Log
 
 
 class Storage:
+    # File system jobs of all the cameras, so a slow disk doesn't occupy the web server threads
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='storage')
+
     def __init__(self, camera_hash):
         self._hash = camera_hash
         self._cam_path = f'{Config.storage_path}/{Config.cameras[self._hash]["folder"]}'
         self._start_time = None
-        self._last_rotation_date = ''
-        self._videos = Videos(self._hash)
+        self._preview_start_time = None
+        self._videos = Videos.instance(self._hash)
+        self._segments = Segments.instance(self._hash)
+        self._sizes = Sizes.instance(self._hash)
+        self._retention = Retention.instance(self._hash)
+        self._inotify = None
+        self._watches = {}  # minute folder: watch descriptor
+        self._poll_task: Optional[asyncio.Task] = None  # started on the inotify queue overflow
+        self._new_sizes: List[Tuple[str, str, int]] = []  # published segments to save into the sizes file
+        self._sizes_task: Optional[asyncio.Task] = None
+        self._restarts = 0
+        self._freezes = 0
 
     async def run(self) -> None:
         """ Start fragments saving
         """
+        await self._start_sizes()  # before the saving is started
+        self._start_watching()
         try:
             await self._start_saving()
         except Exception as e:
             Log.write(f"Storage: ERROR: can't start saving {self._hash} ({repr(e)})")
+        try:
+            await self._start_preview()
+        except Exception as e:
+            Log.write(f"Storage: ERROR: can't start preview {self._hash} ({repr(e)})")
 
     async def _start_saving(self, caller: str = '') -> None:
         """ We'll use system (linux) commands for this job
@@ -40,55 +68,173 @@ class Storage:
         #
         await asyncio.sleep(0.1)
         self.main_process = await asyncio.create_subprocess_exec(*cmd.split())
+        Metrics.inc('cams_subprocesses_total', {'source': 'storage'})
         self._start_time = datetime.now()
         await asyncio.sleep(0.1)
 
         Log.write(f'Storage: {caller} start main process {self.main_process.pid} for {self._hash}')
 
+    async def _start_preview(self, caller: str = '') -> None:
+        """ Optional low quality live frames for the group pages (see Config.preview_command)
+        """
+        cfg = Config.cameras[self._hash]
+        if 'preview_command' in cfg and cfg['preview_command']:
+            cmd = cfg['preview_command']
+        else:
+            cmd = Config.preview_command if hasattr(Config, 'preview_command') else ''
+        if not cmd:
+            return
+        cmd = cmd.replace('{url}', cfg['url']).replace('{preview_path}', f'{self._cam_path}/{Videos.PREVIEW_FILE}')
+
+        self.preview_process = await asyncio.create_subprocess_exec(*cmd.split())
+        Metrics.inc('cams_subprocesses_total', {'source': 'preview'})
+        self._preview_start_time = datetime.now()
+
+        Log.write(f'Storage: {caller} start preview process {self.preview_process.pid} for {self._hash}')
+
+    async def check_preview(self) -> Optional[bool]:
+        """ Restart the preview command if the frame isn't updated (see Supervisor)
+        """
+        if not self._preview_start_time or (datetime.now() - self._preview_start_time).total_seconds() < 60.0:
+            return None
+        if self._videos.get_preview()[0]:
+            return True  # normal case
+
+        Log.print(f'Storage: preview FREEZE detected for "{self._hash}"')
+        try:
+            self._preview_start_time = None
+            self.preview_process.kill()
+        except Exception as e:
+            Log.print(f'Storage: watchdog: kill {self.preview_process.pid} ERROR "{self._hash}" ({repr(e)})')
+
+        await self._start_preview('watchdog: ')
+        return False
+
     async def _mkdir(self, folder: str) -> None:
         """ Create storage folder if not exists
         """
-        cmd = f'mkdir -p {self._cam_path}/{folder}'
-        p = await asyncio.create_subprocess_shell(cmd)
-        await p.wait()
+        await self._run(partial(os.makedirs, f'{self._cam_path}/{folder}', exist_ok=True))
+        self._watch(folder)
 
-    async def watchdog(self) -> None:
-        """ Infinite loop for checking camera(s) availability
+    async def _run(self, func: Callable, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _start_watching(self) -> None:
+        """ Publish finished segments on inotify events, the watchdog polling is used as a fallback
         """
-        while True:
-            await asyncio.sleep(Config.min_segment_duration)
-            try:
-                await self._watchdog()
-            except Exception as e:
-                Log.write(f"Storage: watchdog ERROR: can't check the storage {self._hash} ({repr(e)})")
-
-    async def _watchdog(self) -> None:
-        """ Extremely important piece.
-            Checks if saving is frozen and creates next working directory.
-            Cameras can turn off on power loss, or external commands can freeze.
+        try:
+            self._inotify = Inotify()
+        except Exception as e:
+            Log.write(f'Storage: inotify is not available, polling {self._hash} ({repr(e)})')
+            return
+        asyncio.get_event_loop().add_reader(self._inotify.fd, self._on_inotify)
+        self._segments.pushed = True
+
+    async def _start_sizes(self) -> None:
+        """ Rebuild the last sizes files (they can miss segments of the previous run), then keep them updated
+        """
+        try:
+            for day in [datetime.now() - timedelta(days=1), datetime.now()]:
+                await self._run(self._sizes.sync, day.strftime(const.DT_ROOT_FORMAT))
+        except Exception as e:
+            Log.write(f"Storage: ERROR: can't sync sizes {self._hash} ({repr(e)})")
+            return
+        self._sizes.pushed = True
+
+    def _watch(self, folder: str) -> None:
+        if not self._inotify or folder in self._watches:
+            return
+
+        oldest_folder = (
+            datetime.now() - timedelta(minutes=Segments.MUTABLE_MINUTES)).strftime(const.DT_PATH_FORMAT)
+        for f in [f for f in self._watches if f < oldest_folder]:
+            self._inotify.rm_watch(self._watches.pop(f))
+
+        try:
+            self._watches[folder] = self._inotify.add_watch(f'{self._cam_path}/{folder}', Inotify.IN_CLOSE_WRITE)
+        except OSError as e:
+            Log.print(f'Storage: watch {folder} ERROR "{self._hash}" ({repr(e)})')
+
+    def _on_inotify(self) -> None:
+        for path, mask, name in self._inotify.read():
+            folder = path[len(self._cam_path) + 1:]
+            if mask & Inotify.IN_Q_OVERFLOW:
+                if not self._poll_task or self._poll_task.done():
+                    self._poll_task = asyncio.create_task(self._poll())
+            elif mask & Inotify.IN_IGNORED:
+                self._watches.pop(folder, None)
+            elif mask & Inotify.IN_CLOSE_WRITE and folder:
+                try:
+                    size = os.stat(f'{path}/{name}').st_size
+                except OSError:
+                    continue
+                self._publish(folder, name, size)
+
+    async def _poll(self) -> None:
+        """ Publish finished segments of the previous and working folders, the folders are listed by the executor
+        """
+        now = datetime.now()
+        files = []
+        for folder in [(now - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT), now.strftime(const.DT_PATH_FORMAT)]:
+            names, sizes = await self._run(self._segments.scan, folder)
+            files += [(folder, name, size) for name, size in zip(names, sizes)]
+
+        for folder, name, size in files[:-1]:  # the last one is still being written
+            self._publish(folder, name, size)
+
+    def _publish(self, folder: str, name: str, size: int) -> None:
+        self._segments.publish(folder, name, size)
+        if self._sizes.pushed:
+            self._new_sizes.append((folder, name, size))
+            if not self._sizes_task:
+                self._sizes_task = asyncio.create_task(self._save_sizes())
+
+    async def _save_sizes(self) -> None:
+        """ Append the published segments to the sizes file by the executor, one batch at a time to keep the order
+        """
+        try:
+            while self._new_sizes:
+                batch, self._new_sizes = self._new_sizes, []
+                try:
+                    await self._run(self._append_sizes, batch)
+                except OSError as e:
+                    Log.write(f"Storage: ERROR: can't save sizes {self._hash} ({repr(e)})")
+        finally:
+            self._sizes_task = None
+
+    def _append_sizes(self, batch: List[Tuple[str, str, int]]) -> None:
+        for folder, name, size in batch:
+            if self._sizes.append(folder, name, size):
+                self._retention.add(size)  # once per segment
+
+    async def check(self) -> None:
+        """ Extremely important piece, runs every min_segment_duration (see Supervisor).
+            Creates next working directory, publishes segments if there is no inotify, detects motions.
         """
         if not self._start_time:
             return
 
-        prev_dir = f'{self._cam_path}/{(datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)}'
-        working_dir = f'{self._cam_path}/{datetime.now().strftime(const.DT_PATH_FORMAT)}'
-        cmd = f'ls -l {prev_dir}/* {working_dir}/* | awk ' + "'{print $5,$9}'"
-        p = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, _stderr = await p.communicate()
-        res = stdout.decode().strip().splitlines()[-10:]
+        if not self._inotify:
+            await self._poll()
 
         await self._mkdir((datetime.now() + timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT))
-        await self._cleanup()
 
-        self._live_motion_detector(res[:-1])
+        self._live_motion_detector(self._segments.recent())
+
+    async def check_recorder(self) -> Optional[bool]:
+        """ Checks if saving is frozen and restarts it.
+            Cameras can turn off on power loss, or external commands can freeze.
+            Restarts of the dead camera are backed off by the Supervisor.
+        """
+        if not self._start_time or (datetime.now() - self._start_time).total_seconds() < 60.0:
+            return None  # starting
 
-        if res or not self._start_time or (datetime.now() - self._start_time).total_seconds() < 60.0:
-            return  # normal case
+        prev_folder = (datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)
+        if self._segments.last()[0] >= prev_folder:
+            return True  # normal case
 
         Log.print(f'Storage: FREEZE detected for "{self._hash}"')
+        self._freezes += 1
 
         # Freeze detected, restart
         try:
@@ -98,87 +244,76 @@ class Storage:
             Log.print(f'Storage: watchdog: kill {self.main_process.pid} ERROR "{self._hash}" ({repr(e)})')
 
         await self._start_saving('watchdog: ')
+        self._restarts += 1
 
         # Remove previous folders if empty
         prev_min = datetime.now() - timedelta(minutes=1)
-        if not await self._remove_folder_if_empty(prev_min.strftime(const.DT_PATH_FORMAT)):
-            return
-        if not await self._remove_folder_if_empty(prev_min.strftime(f'{const.DT_ROOT_FORMAT}/%H')):
-            return
-        await self._remove_folder_if_empty(prev_min.strftime(const.DT_ROOT_FORMAT))
+        if (await self._remove_folder_if_empty(prev_min.strftime(const.DT_PATH_FORMAT))
+                and await self._remove_folder_if_empty(prev_min.strftime(f'{const.DT_ROOT_FORMAT}/%H'))):
+            await self._remove_folder_if_empty(prev_min.strftime(const.DT_ROOT_FORMAT))
+        return False
+
+    async def check_retention(self) -> None:
+        """ Remove the oldest folders by age and quota, a few per run (see Supervisor and Retention)
+        """
+        if not self._sizes.pushed:
+            return  # the bytes can't be counted yet
+        removed = await self._run(self._retention.evict)
+        if removed:
+            Log.print(f'Storage: retention: {removed} folders removed from {self._hash}')
+
+    def get_status(self) -> Dict[str, Any]:
+        """ Recorder process, restarts, the last finished segment age (secs) and the storage size
+        """
+        path = self._segments.last()[0]
+        age = None
+        if path:
+            date_time = datetime.strptime(
+                self._videos.get_datetime_by_path(f'{self._cam_path}/{path}'), const.DT_WEB_FORMAT)
+            age = round((datetime.now() - date_time).total_seconds())
+        return {
+            'pid': self.main_process.pid if self._start_time else None,
+            'segment_age': age,
+            'restarts': self._restarts,
+            'freezes': self._freezes,
+            'bytes': self._retention.get_bytes(),
+        }
 
-    def _live_motion_detector(self, file_list) -> None:
+    def _live_motion_detector(self, file_list: List[Tuple[str, int]]) -> None:
         cfg = Config.cameras[self._hash]
         if cfg['sensitivity'] <= 1 or len(file_list) < 2:
             return
         total_size = 0
         cnt = 0
-        for file in file_list[:-1]:
-            f = file.split(' ')
-            if int(f[0]) <= self._videos.MIN_FILE_SIZE:
+        for _path, size in file_list[:-1]:
+            if size <= self._videos.MIN_FILE_SIZE:
                 continue
-            total_size += int(f[0])
+            total_size += size
             cnt += 1
         if not cnt:
             return
 
-        last_file = file_list[-1].split(' ')
+        last_path, last_size = file_list[-1]
         average_size = total_size / cnt
 
-        if float(last_file[0]) > average_size * cfg['sensitivity']:
-            date_time = self._videos.get_datetime_by_path(last_file[1])
-            if self._hash in Share.cam_motions and Share.cam_motions[self._hash] >= date_time:
+        if last_size > average_size * cfg['sensitivity']:
+            date_time = self._videos.get_datetime_by_path(f'{self._cam_path}/{last_path}')
+            if not Motions.publish(self._hash, date_time):
                 return
-            Share.cam_motions[self._hash] = date_time
             Log.print(f'Storage: motion detected: {date_time} {self._hash}')
 
     async def _remove_folder_if_empty(self, folder) -> bool:
-        path = f'{self._cam_path}/{folder}'
-
-        cmd = f'ls -A {path}'
-        p = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, _stderr = await p.communicate()
-        if stdout:
-            return False  # not empty
-
-        cmd = f'rmdir {path}'
-        p = await asyncio.create_subprocess_shell(cmd)
-        res = await p.wait()  # returns 0 if success (folder was empty, removed), else 1
-        if res == 0:
-            Log.write(f'Storage: watchdog: folder {folder} removed from {self._hash}')
-            return True
-        return False
+        if not await self._run(self._rmdir, f'{self._cam_path}/{folder}'):
+            return False
+        Log.write(f'Storage: watchdog: folder {folder} removed from {self._hash}')
+        return True
 
-    async def _cleanup(self) -> None:
-        """ Cleanup (once a day)
+    @staticmethod
+    def _rmdir(path: str) -> bool:
+        """ Remove the folder if it's empty
         """
-        now_date = datetime.now().strftime(const.DT_ROOT_FORMAT)
-        if self._last_rotation_date and self._last_rotation_date == now_date:
-            return
-        self._last_rotation_date = now_date
-
-        cmd = f'ls -d {self._cam_path}/*'
-        p = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, _stderr = await p.communicate()
-        if not stdout:
-            return
-
-        oldest_folder = (datetime.now() - timedelta(days=Config.storage_period_days)).strftime(const.DT_ROOT_FORMAT)
-
-        for row in stdout.decode().strip().split('\n'):
-            wd = row.split('/')[-1]
-            if wd >= oldest_folder or not wd:
-                break
-            cmd = f'rm -rf {self._cam_path}/{wd}'
-            p = await asyncio.create_subprocess_shell(cmd)
-            await p.wait()
-
-            Log.write(f'Storage: cleanup: remove {self._hash} {wd}')
-
-            # todo: remove unfinished (low sized) files & daily empty folders
+        try:
+            os.rmdir(path)
+        except OSError:
+            return False  # not empty or not exists
+        return True
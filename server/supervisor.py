@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Callable, Awaitable, Optional, Dict, Any, List, Set
+from log import Log
+from profiler import Profiler
+
+
+class Job:
+    def __init__(self, name: str, cam_hash: str, func: Callable[[], Awaitable[Optional[bool]]], interval: float,
+                 status: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.name = name
+        self.cam_hash = cam_hash
+        self.func = func  # returns True if healthy, False if failed, None if unknown (starting)
+        self.interval = interval
+        self.status = status
+        self.due = 0.0
+        self.running = False
+        self.failures = 0
+        self.last_run = 0.0
+        self.duration = 0.0
+
+
+class Supervisor:
+    """ One scheduler for the periodic checks of all the cameras (recorders, events, sprites).
+        Jobs with the same interval are staggered over it, failing jobs are backed off exponentially.
+    """
+    RESOLUTION = 0.5  # secs
+    MAX_BACKOFF = 300  # secs
+    SLOW_JOB = 1.0  # secs, longer jobs are logged
+
+    _jobs: List[Job] = []
+    _tasks: Set[asyncio.Task] = set()  # the loop keeps weak references only
+
+    @classmethod
+    def add(cls, name: str, cam_hash: str, func: Callable[[], Awaitable[Optional[bool]]], interval: float,
+            status: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+        """ Run the coroutine function every interval secs, status() is added to the job status
+        """
+        cls._jobs.append(Job(name, cam_hash, func, interval, status))
+
+    @classmethod
+    async def run(cls) -> None:
+        cls._stagger()
+        Log.write(f'Supervisor: start {len(cls._jobs)} jobs')
+        while True:
+            now = time.monotonic()
+            for job in cls._jobs:
+                if not job.running and job.due <= now:
+                    job.running = True
+                    task = asyncio.create_task(cls._run_job(job))
+                    cls._tasks.add(task)
+                    task.add_done_callback(cls._tasks.discard)
+            await asyncio.sleep(cls.RESOLUTION)
+
+    @classmethod
+    def status(cls) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """ {camera hash: {job name: {healthy, failures, last run age, duration, ...}}}
+        """
+        now = time.monotonic()
+        res = {}
+        for job in cls._jobs:
+            info = {
+                'healthy': not job.failures,
+                'failures': job.failures,
+                'age': round(now - job.last_run, 3) if job.last_run else None,
+                'duration': round(job.duration, 3),
+            }
+            if job.status:
+                info.update(job.status())
+            res.setdefault(job.cam_hash, {})[job.name] = info
+        return res
+
+    @classmethod
+    def _stagger(cls) -> None:
+        """ Spread the first runs of the same interval jobs, so their I/O doesn't line up
+        """
+        now = time.monotonic()
+        groups: Dict[float, List[Job]] = {}
+        for job in cls._jobs:
+            groups.setdefault(job.interval, []).append(job)
+        for interval, jobs in groups.items():
+            for i, job in enumerate(jobs):
+                job.due = now + interval * (1 + i / len(jobs))
+
+    @classmethod
+    async def _run_job(cls, job: Job) -> None:
+        start = time.monotonic()
+        try:
+            if Profiler.is_enabled(job.cam_hash):
+                healthy = await Profiler.profile(f'{job.name} {job.cam_hash}', job.func())
+            else:
+                healthy = await job.func()
+        except Exception as e:
+            Log.write(f"Supervisor: ERROR: {job.name} job failed for {job.cam_hash} ({repr(e)})")
+            healthy = False
+        job.last_run = time.monotonic()
+        job.duration = job.last_run - start
+        if job.duration > cls.SLOW_JOB:
+            Log.print(f'Supervisor: slow {job.name} job {round(job.duration, 3)}s for {job.cam_hash}')
+
+        if healthy:
+            job.failures = 0
+        elif healthy is not None:
+            job.failures += 1
+        job.due = job.last_run + min(job.interval * 2 ** min(job.failures, 16), max(cls.MAX_BACKOFF, job.interval))
+        job.running = False
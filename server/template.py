@@ -0,0 +1,72 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class Template:
+    """ Page (layout with the page content) compiled into literal chunks and placeholder slots.
+        Source files are re-read only if their mtime is changed.
+    """
+    CLIENT_PATH = os.path.realpath(f'{os.path.dirname(os.path.realpath(__file__))}/../client')
+    LAYOUT = '/layout.html'
+    CHECK_INTERVAL = 1  # seconds between the source files mtime checks
+    PLACEHOLDER = re.compile(rb'{([a-z_]+)}')
+
+    _templates = {}
+    _lock = threading.Lock()
+
+    def __init__(self, name: str):
+        self._name = name
+        self._mtimes = []
+        self._checked = 0.0
+        # Literal chunks and (placeholder name, placeholder literal) slots between them
+        self._compiled: Tuple[List[bytes], List[Tuple[str, bytes]]] = ([], [])
+
+    @classmethod
+    def get(cls, name: str) -> 'Template':
+        template = cls._templates.get(name)
+        if not template:
+            with cls._lock:
+                template = cls._templates.setdefault(name, cls(name))
+        template._refresh()
+        return template
+
+    def render(self, values: Dict[str, bytes]) -> bytes:
+        """ Unknown placeholders are kept as is
+        """
+        chunks, slots = self._compiled
+        res = [chunks[0]]
+        for i, (name, literal) in enumerate(slots):
+            res.append(values.get(name, literal))
+            res.append(chunks[i + 1])
+        return b''.join(res)
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._mtimes and now - self._checked < self.CHECK_INTERVAL:
+            return
+        self._checked = now
+
+        paths = [f'{self.CLIENT_PATH}{self.LAYOUT}', f'{self.CLIENT_PATH}{self._name}']
+        mtimes = [os.stat(path).st_mtime_ns for path in paths]
+        if mtimes == self._mtimes:
+            return
+
+        with open(paths[0], 'rb') as file:
+            layout = file.read()
+        with open(paths[1], 'rb') as file:
+            content = file.read()
+        self._compiled = self._compile(layout.replace(b'{content}', content))
+        self._mtimes = mtimes
+
+    def _compile(self, source: bytes) -> Tuple[List[bytes], List[Tuple[str, bytes]]]:
+        chunks, slots = [], []
+        pos = 0
+        for match in self.PLACEHOLDER.finditer(source):
+            chunks.append(source[pos:match.start()])
+            slots.append((match.group(1).decode('ascii'), match.group(0)))
+            pos = match.end()
+        chunks.append(source[pos:])
+        return chunks, slots
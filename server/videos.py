@@ -1,10 +1,18 @@
+import asyncio
+import os
 import re
-import subprocess
 import time
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import accumulate, chain
 from datetime import datetime, timedelta
-from typing import Tuple, List, Dict, Any, Optional
+from typing import Tuple, List, Dict, Any, Optional, Iterator, Sequence
 import const
 from _config import Config
+from segments import Segments
+from sizes import Sizes
 from log import Log
 
 
@@ -12,18 +20,37 @@ class Videos:
     DEPTH = 3
     MIN_FILE_SIZE = 1000
     MD_AVERAGE_LEN = 10
+    LIVE_TIMEOUT = 10  # seconds to wait for the next live segment
+    LIVE_POLL_INTERVAL = 0.5  # used if segments are not published by the storage watcher
+    PREVIEW_FILE = '.preview.jpg'  # low quality live frame, see Config.preview_command
+    PREVIEW_MAX_AGE = 60  # older preview means the preview command is frozen
+    EXPORT_MAX_SECONDS = 12 * 3600  # ?video=export duration limit
+
+    _instances = {}
+    _lock = threading.Lock()
 
     def __init__(self, cam_hash: str):
+        """ Use instance(), the object is shared by all the requests (it has no per-request state)
+        """
         self._hash = cam_hash
         self._cam_path = f'{Config.storage_path}/{Config.cameras[self._hash]["folder"]}'
-        self._range = const.MAX_RANGE
-        self._root_folder = []
-        self._date_time = ''
+        self._segments = Segments.instance(self._hash)
+        self._sizes = Sizes.instance(self._hash)
+
+    @classmethod
+    def instance(cls, cam_hash: str) -> 'Videos':
+        if cam_hash not in cls._instances:
+            with cls._lock:
+                if cam_hash not in cls._instances:
+                    cls._instances[cam_hash] = cls(cam_hash)
+        return cls._instances[cam_hash]
 
     def get_days(self) -> int:
         return round((datetime.now() - self._get_start_date()).total_seconds() / 86400)
 
-    def get(self, args: Dict[str, List[Any]]) -> Tuple[str, int]:
+    def get(self, args: Dict[str, List[Any]]) -> Tuple[str, int, bool]:
+        """ Segment path, size and live flag. Empty live result means the client already has the last segment.
+        """
         date_time = args['dt'][0] if 'dt' in args else ''
 
         if args['video'][0] == 'next':
@@ -37,14 +64,100 @@ class Videos:
 
         return self._get_live(date_time)
 
+    def get_preview(self) -> Tuple[str, int, str]:
+        """ Low quality live frame path, size and date time, empty if there is no fresh one
+        """
+        path = f'{self._cam_path}/{self.PREVIEW_FILE}'
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return '', 0, ''
+        if stat.st_mtime < time.time() - self.PREVIEW_MAX_AGE:
+            return '', 0, ''
+        return path, stat.st_size, datetime.fromtimestamp(stat.st_mtime).strftime(const.DT_WEB_FORMAT)
+
+    def get_motions(self, args: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """ All the motions between ?from= and ?to= date times (the whole archive by default)
+            with their time range positions
+        """
+        if not self._get_folders():
+            return []
+        start_date = self._get_start_date()
+        now = datetime.now()
+        try:
+            date_from = datetime.strptime(args['from'][0], const.DT_WEB_FORMAT) if 'from' in args else start_date
+            date_to = datetime.strptime(args['to'][0], const.DT_WEB_FORMAT) if 'to' in args else now
+            sensitivity = int(args['md'][0]) if 'md' in args else 50
+        except ValueError:
+            return []
+        epoch_from, epoch_to = int(date_from.timestamp()), int(date_to.timestamp())
+        scan_from = date_from.replace(second=0)  # detect from the minute folder border, as _get_next_motion()
+
+        days = self._get_folders()
+        initial, window = self._get_average_start(days, int((scan_from - timedelta(minutes=1)).timestamp()))
+        epochs, sizes = array('I'), array('I')
+        for day in days:
+            if not scan_from.strftime(const.DT_ROOT_FORMAT) <= day <= date_to.strftime(const.DT_ROOT_FORMAT):
+                continue
+            day_epochs, day_sizes = self._sizes.get(day)
+            i, j = bisect_left(day_epochs, int(scan_from.timestamp())), bisect_right(day_epochs, epoch_to)
+            epochs.extend(day_epochs[i:j])
+            sizes.extend(day_sizes[i:j])
+
+        start_epoch = start_date.timestamp()
+        total_seconds = max(1.0, now.timestamp() - start_epoch)
+        res = []
+        for i in self._detect_motions(initial, window, sizes, sensitivity):
+            if epochs[i] < epoch_from:
+                continue
+            res.append({
+                'dt': datetime.fromtimestamp(epochs[i]).strftime(const.DT_WEB_FORMAT),
+                'range': round(const.MAX_RANGE * (epochs[i] - start_epoch) / total_seconds),
+            })
+        return res
+
+    def get_export(self, args: Dict[str, List[Any]]) -> List[str]:
+        """ Paths of the finished segments between ?from= and ?to= date times (up to EXPORT_MAX_SECONDS)
+        """
+        try:
+            date_from = datetime.strptime(args['from'][0], const.DT_WEB_FORMAT)
+            date_to = datetime.strptime(args['to'][0], const.DT_WEB_FORMAT) if 'to' in args else datetime.now()
+        except (KeyError, ValueError):
+            return []
+        epoch_from = int(date_from.timestamp())
+        epoch_to = min(int(date_to.timestamp()), epoch_from + self.EXPORT_MAX_SECONDS)
+        live_path, _size = self._get_live_file()
+        if live_path:  # the next segments are still written
+            live_epoch = int(datetime.strptime(self.get_datetime_by_path(live_path), const.DT_WEB_FORMAT).timestamp())
+            epoch_to = min(epoch_to, live_epoch)
+
+        paths = []
+        for epoch, size in self._iter_sizes(self._get_folders(), epoch_from, 1):
+            if epoch > epoch_to:
+                break
+            if size > self.MIN_FILE_SIZE:
+                paths.append(self._get_path_by_epoch(epoch))
+        return paths
+
+    async def wait_live(self, date_time: str, timeout: float) -> bool:
+        """ Wait for the live segment following the one the client already has (see get()).
+            Returns False if the client's date time is unknown.
+        """
+        path = self._get_path_by_datetime(date_time)
+        if not path:
+            return False
+        if self._segments.pushed:
+            await self._segments.wait(path, timeout)
+        else:
+            await asyncio.sleep(min(self.LIVE_POLL_INTERVAL, timeout))
+        return True
+
     def get_datetime_by_path(self, path: str) -> str:
         relative_path = path[len(self._cam_path) + 1:]
         no_ext = re.sub(r'\.[^.]+$', '', relative_path)
         return re.sub(r'[^\d]', '', no_ext)
 
     def get_range_by_path(self, path: str) -> str:
-        if self._range > const.MAX_RANGE:
-            return str(self._range)
         start_date = self._get_start_date()
         total_seconds = (datetime.now() - start_date).total_seconds()
         delta_seconds = (
@@ -52,22 +165,20 @@ class Videos:
         ).total_seconds()
         return str(round(const.MAX_RANGE * delta_seconds / total_seconds))
 
-    def _get_live(self, date_time: Optional[str] = '') -> Tuple[str, int]:
-        self._range = const.MAX_RANGE + 1
-
+    def _get_live(self, date_time: Optional[str] = '') -> Tuple[str, int, bool]:
         path, size = self._get_live_file()  # checks now and last minute folder
         if not size:
             fallback = (datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT).split('/')
-            return self._find_nearest_file('/'.join(fallback[0:-1]), fallback[-1], -1)
+            path, size, _live = self._find_nearest_file('/'.join(fallback[0:-1]), fallback[-1], -1)
+            return path, size, bool(size)
 
         segment_date_time = self.get_datetime_by_path(path)
         if not date_time or segment_date_time > date_time or not Config.storage_enabled:
-            return path, size
+            return path, size, True
 
-        time.sleep(0.5)
-        return self._get_live(date_time)
+        return '', 0, True  # see wait_live()
 
-    def _get_by_range(self, rng: int) -> Tuple[str, int]:
+    def _get_by_range(self, rng: int) -> Tuple[str, int, bool]:
         rng = min(max(rng, 0), const.MAX_RANGE)
 
         start_date = self._get_start_date()
@@ -78,42 +189,34 @@ class Videos:
         parts = wd.split('/')
         return self._find_nearest_file('/'.join(parts[0:-1]), parts[-1], 1)
 
-    def _get_next(self, step: int, date_time: str, sensitivity: int) -> Tuple[str, int]:
+    def _get_next(self, step: int, date_time: str, sensitivity: int) -> Tuple[str, int, bool]:
         if not date_time:
             return self._get_live()
 
-        self._date_time = date_time
-
         if sensitivity >= 0:
-            return self._get_next_motion(sensitivity, step)
+            return self._get_next_motion(date_time, sensitivity, step)
 
         file_path = self._get_path_by_datetime(date_time)
         parts = file_path.split('/')
         wd = '/'.join(parts[0:-1])
 
-        files = []
+        paths, sizes = [], []
         if -10 < step < 0:
             prev_dir = (datetime.strptime(date_time, const.DT_WEB_FORMAT) - timedelta(minutes=1)
                         ).strftime(const.DT_PATH_FORMAT)
-            files = self._get_files_by_folders([prev_dir, wd])
+            paths, sizes = self._get_files_by_folders([prev_dir, wd])
         elif 0 < step < 10:
             next_dir = (datetime.strptime(date_time, const.DT_WEB_FORMAT) + timedelta(minutes=1)
                         ).strftime(const.DT_PATH_FORMAT)
-            files = self._get_files_by_folders([wd, next_dir])
-        if files and abs(step) < len(files):
-            arr = files if step > 0 else reversed(files)
-            working_path = f'{self._cam_path}/{file_path}'
-            i = 0
-            for file in arr:
-                f = file.split()
-                path = f[1]
-                if (step > 0 and path <= working_path) or (step < 0 and path >= working_path):
-                    continue
-                i += 1
-                if i < abs(step):
-                    continue
-                if int(f[0]) > self.MIN_FILE_SIZE:
-                    return path, int(f[0])
+            paths, sizes = self._get_files_by_folders([wd, next_dir])
+        if paths and abs(step) < len(paths):
+            if step > 0:  # skip the files up to the requested one
+                indexes = range(bisect_right(paths, file_path) + step - 1, len(paths))
+            else:
+                indexes = range(bisect_left(paths, file_path) + step, -1, -1)
+            for i in indexes:
+                if sizes[i] > self.MIN_FILE_SIZE:
+                    return f'{self._cam_path}/{paths[i]}', sizes[i], False
 
         sign = 1 if step > 0 else -1
         seconds = max(60, abs(step))
@@ -131,178 +234,201 @@ class Videos:
     def _get_start_date(self) -> datetime:
         return datetime.strptime(self._get_folders()[0], const.DT_ROOT_FORMAT)
 
-    def _find_nearest_file(self, parent: str, folder: str, step: int) -> Tuple[str, int]:
-        """ If folder is set shift left (to parent folder); else shift right (to child folder) """
-        parts = parent.split('/') if parent else []
-
-        if (folder and len(parts) == self.DEPTH - 1) or (not folder and len(parts) == self.DEPTH):
-            path = f'{parent}/{folder}'.rstrip('/')
-            position = step - 1 if step > 0 else step
-            file, size = self._get_file(path, position)
-            if size:
-                return file, size
-
-        folders = self._get_folders(parent)
-        if not folders and len(parts) > 0:
-            return self._find_nearest_file('/'.join(parts[0:-1]), parts[-1], step)  # shift left
-
-        if folder:
-            if step < 0:  # find the largest element of folders less than folder
-                rest = [i for i in folders if i < folder]
-            else:  # find the smallest element of folders greater than folder
-                rest = [i for i in folders if i > folder]
-            if rest:
-                parts.append(max(rest) if step < 0 else min(rest))
-                return self._find_nearest_file('/'.join(parts), '', step)  # shift right
-
-            if len(parts) > 0:
-                return self._find_nearest_file('/'.join(parts[0:-1]), parts[-1], step)  # shift left
-            elif step < 0:
-                return self._find_nearest_file('', '', 1)  # move to the beginning
-            else:
-                return self._get_live()  # move to the end
+    def _find_nearest_file(self, parent: str, folder: str, step: int) -> Tuple[str, int, bool]:
+        """ If folder is set shift left (to parent folder); else shift right (to child folder).
+            Iterative walk over the cached folder listings, siblings are found with bisect.
+        """
+        wrapped = False  # the backward search is continued from the beginning
+        while True:
+            parts = parent.split('/') if parent else []
+
+            if (folder and len(parts) == self.DEPTH - 1) or (not folder and len(parts) == self.DEPTH):
+                path = f'{parent}/{folder}'.rstrip('/')
+                position = step - 1 if step > 0 else step
+                file, size = self._get_file(path, position)
+                if size:
+                    return file, size, False
+
+            folders = self._get_folders(parent)
+            if not folders and len(parts) > 0:
+                parent, folder = '/'.join(parts[0:-1]), parts[-1]  # shift left
+                continue
 
-        if not folder and folders and len(parts) < self.DEPTH:
-            parts.append(folders[-1]) if step < 0 else parts.append(folders[0])
-            return self._find_nearest_file('/'.join(parts), '', step)  # shift right
+            if folder:
+                if step < 0:  # find the largest element of folders less than folder
+                    i = bisect_left(folders, folder)
+                    nearest = folders[i - 1] if i > 0 else ''
+                else:  # find the smallest element of folders greater than folder
+                    i = bisect_right(folders, folder)
+                    nearest = folders[i] if i < len(folders) else ''
+
+                if nearest:
+                    parent, folder = '/'.join(parts + [nearest]), ''  # shift right
+                elif len(parts) > 0:
+                    parent, folder = '/'.join(parts[0:-1]), parts[-1]  # shift left
+                elif step < 0:
+                    parent, folder, step, wrapped = '', '', 1, True  # move to the beginning
+                elif wrapped:
+                    return '', 0, False  # no segments at all, _get_live() would search backward again
+                else:
+                    return self._get_live()  # move to the end
+                continue
 
-        Log.print(f'find_nearest_file: not found: {parent}[/{folder}], step={step}')
+            if folders and len(parts) < self.DEPTH:
+                parent = '/'.join(parts + [folders[-1] if step < 0 else folders[0]])  # shift right
+                continue
 
-        return '', 0
+            Log.print(f'find_nearest_file: not found: {parent}[/{folder}], step={step}')
+            return '', 0, False
 
-    def _get_next_motion(self, sensitivity: int, step: int) -> Tuple[str, int]:
+    def _get_next_motion(self, date_time: str, sensitivity: int, step: int) -> Tuple[str, int, bool]:
+        """ Scan the day sizes files with the rolling average of the last segments (see _get_average_start())
+        """
         sign = 1 if step > 0 else -1
-        if step >= 60 or step <= -60:
-            folder = (
-                datetime.strptime(self._date_time, const.DT_WEB_FORMAT) + timedelta(seconds=abs(step)) * sign
-            ).strftime(const.DT_PATH_FORMAT)
-        else:
-            path = self._get_path_by_datetime(self._date_time)
-            folder = '/'.join(path.split('/')[0:-1])
-
-        last_files = {}
-        prev_folder = (
-            datetime.strptime(folder, const.DT_PATH_FORMAT) - timedelta(minutes=1) * sign
-        ).strftime(const.DT_PATH_FORMAT)
-        files = self._get_files(prev_folder)
-        if files:
-            for file in files:
-                f = file.split(' ')
-                last_files[f'{prev_folder}/{f[1]}'] = int(f[0])
-
-        return self._motion_detector(folder, last_files, 100 - max(0, min(90, sensitivity)), sign)
-
-    def _motion_detector(self, folder: str, last_files: Dict[str, int], sensitivity: int, sign: int) -> Tuple[str, int]:
-        requested_path = self._get_path_by_datetime(self._date_time)
-        files = self._get_files(folder)
-        if not files:
-            if sign > 0 and folder >= self._get_folders()[-1]:
-                return self._get_live()
-            if sign < 0 and folder <= self._get_folders()[0]:
-                return '', 0
-
-            file = self._find_nearest_file(folder, '', sign)
-            if file:
-                next_folder = '/'.join(file[0][len(self._cam_path) + 1:].split('/')[0:-1])
-                if (sign > 0 and next_folder <= folder) or (sign < 0 and next_folder >= folder):
-                    return '', 0
-                return self._motion_detector(next_folder, last_files, sensitivity, sign)
-
-        sens = 1 + sensitivity / 100
-        if sign < 0:
-            files.reverse()
-        for file in files:
-            f = file.split(' ')
-            if float(f[0]) < self.MIN_FILE_SIZE:  # exclude broken files
+        requested = datetime.strptime(date_time, const.DT_WEB_FORMAT)
+        start = requested + timedelta(seconds=abs(step)) * sign if abs(step) >= 60 else requested
+        start = start.replace(second=0 if sign > 0 else 59)  # detect from the minute folder border
+        start_epoch = int(start.timestamp())
+        requested_epoch = int(requested.timestamp())
+        sens = self._get_sensitivity(sensitivity)
+
+        days = self._get_folders()
+        prev_minute = int((start.replace(second=0) - timedelta(minutes=1) * sign).timestamp())
+        initial, window = self._get_average_start(days, prev_minute)
+        last_sizes = deque(initial, maxlen=window)
+        total_size = sum(last_sizes)
+
+        for epoch, size in self._iter_sizes(days, start_epoch, sign):
+            if size < self.MIN_FILE_SIZE:  # exclude broken files
                 continue
-            average_size = sum(last_files.values()) / len(last_files) if last_files else 0
+            # don't detect the files before last motion & last motion itself
+            if (epoch - requested_epoch) * sign > 0 and last_sizes and size > total_size / len(last_sizes) * sens:
+                return self._get_path_by_epoch(epoch), size, False
 
-            last_files[f'{folder}/{f[1]}'] = int(f[0])
-            if len(last_files) > self.MD_AVERAGE_LEN:
-                first_key = next(iter(last_files))
-                del last_files[first_key]
+            if len(last_sizes) == last_sizes.maxlen:
+                total_size -= last_sizes[0]
+            last_sizes.append(size)
+            total_size += size
 
-            path = f'{folder}/{f[1]}'
-
-            if (sign > 0 and requested_path >= path) or (sign < 0 and requested_path <= path):
-                continue  # don't detect the files before last motion & last motion itself
-
-            if average_size and float(f[0]) > average_size * sens:
-                return f'{self._cam_path}/{folder}/{f[1]}', int(f[0])
-
-        if folder >= datetime.now().strftime(const.DT_PATH_FORMAT):
+        if sign > 0:
             return self._get_live()
+        return '', 0, False
+
+    def _get_average_start(self, days: List[str], minute_epoch: int) -> Tuple[List[int], int]:
+        """ The motions average is started by all the segments of the minute folder before the scan start
+            (broken files too), the window is MD_AVERAGE_LEN segments or that folder length if it's longer.
+            Returns the folder sizes and the window length.
+        """
+        initial = []
+        for epoch, size in self._iter_sizes(days, minute_epoch, 1):
+            if epoch >= minute_epoch + 60:
+                break
+            initial.append(size)
+        return initial, max(self.MD_AVERAGE_LEN, len(initial))
+
+    @classmethod
+    def _detect_motions(cls, initial: Sequence[int], window: int, sizes: Sequence[int], sensitivity: int
+                        ) -> List[int]:
+        """ Indexes of the sizes above the rolling average of the window previous ones, the same as
+            _get_next_motion() (the average is started by the initial sizes, broken files are skipped).
+            All the averages come from one cumulative sums pass.
+        """
+        valid = [i for i, size in enumerate(sizes) if size >= cls.MIN_FILE_SIZE]
+        sums = [0]
+        sums.extend(accumulate(chain(initial, (sizes[i] for i in valid))))
+        sens = cls._get_sensitivity(sensitivity)
+        res = []
+        for k, i in enumerate(valid, len(initial)):
+            n = min(k, window)
+            if n and sizes[i] * n > (sums[k] - sums[k - n]) * sens:
+                res.append(i)
+        return res
 
-        next_folder = (
-            datetime.strptime(folder, const.DT_PATH_FORMAT) + timedelta(minutes=1) * sign
-        ).strftime(const.DT_PATH_FORMAT)
+    @staticmethod
+    def _get_sensitivity(sensitivity: int) -> float:
+        """ Client sensitivity (0..90) to the size / average size threshold
+        """
+        return 1 + (100 - max(0, min(90, sensitivity))) / 100
+
+    def _iter_sizes(self, days: List[str], epoch: int, sign: int) -> Iterator[Tuple[int, int]]:
+        """ Segments (epoch, size) starting from the epoch (inclusive) in the scan direction
+        """
+        day = datetime.fromtimestamp(epoch).strftime(const.DT_ROOT_FORMAT)
+        if sign > 0:
+            days = days[bisect_left(days, day):]
+        else:
+            i = bisect_right(days, day)
+            days = days[i - 1::-1] if i else []
 
-        return self._motion_detector(next_folder, last_files, sensitivity, sign)
+        for day in days:
+            epochs, sizes = self._sizes.get(day)
+            if sign > 0:
+                indexes = range(bisect_left(epochs, epoch), len(epochs))
+            else:
+                indexes = range(bisect_right(epochs, epoch) - 1, -1, -1)
+            for i in indexes:
+                yield epochs[i], sizes[i]
 
     def _get_folders(self, folder: str = '') -> List[str]:
-        if not folder and self._root_folder:
-            return self._root_folder
-        cmd = f'ls {self._cam_path}/{folder}'
-        res = self._exec(cmd).splitlines()
-        if not folder:
-            self._root_folder = res
-        return res
+        return self._segments.folders(folder)
 
-    def _get_files(self, folder: str) -> List[str]:
-        wd = f"{self._cam_path}/{folder}"
-        cmd = f'ls -l {wd} | awk ' + "'{print $5,$9}'"
-        res = self._exec(cmd)
-        if not res and folder and folder < datetime.now().strftime(const.DT_PATH_FORMAT):
-            self._exec(f'rmdir {self._cam_path}/{folder}')  # delete empty folder
-        return res.splitlines()
+    def _get_files(self, folder: str) -> Tuple[List[str], List[int]]:
+        names, sizes = self._segments.files(folder)
+        if not names and folder and folder < datetime.now().strftime(const.DT_PATH_FORMAT):
+            self._segments.remove_empty(folder)  # delete empty folder
+        return names, sizes
 
-    def _get_files_by_folders(self, folders: List[str]) -> List[str]:
-        paths = ''
+    def _get_files_by_folders(self, folders: List[str]) -> Tuple[List[str], List[int]]:
+        paths, sizes = [], []
         for folder in folders:
-            paths = f'{paths}{self._cam_path}/{folder}/* '
-        cmd = f'ls -l {paths} | awk ' + "'{print $5,$9}'"
-        return self._exec(cmd).splitlines()
+            names, folder_sizes = self._segments.files(folder)
+            paths += [f'{folder}/{name}' for name in names]
+            sizes += folder_sizes
+        return paths, sizes
 
     def _get_file(self, folder: str, position: int = 0) -> Tuple[str, int]:
-        files = self._get_files(folder)
-        if not files or len(files) <= position or len(files) < abs(position):
+        names, sizes = self._get_files(folder)
+        if not names or len(names) <= position or len(names) < abs(position):
             return '', 0
-        file = files[position].split()  # [size, file]
-        path = f'{self._cam_path}/{folder}/{file[1]}'
-        size = int(file[0])
+        path = f'{self._cam_path}/{folder}/{names[position]}'
+        size = sizes[position]
         if size > self.MIN_FILE_SIZE:
             return path, size
-        if position < 0 and len(files) > abs(position):
+        if position < 0 and len(names) > abs(position):
             return self._get_file(folder, position - 1)
         return '', 0
 
     def _get_live_file(self):
+        if self._segments.pushed:  # the last finished segment is known without scanning
+            path, size = self._segments.last()
+            prev_folder = (datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)
+            if path < prev_folder or size < self.MIN_FILE_SIZE:
+                return '', 0
+            return f'{self._cam_path}/{path}', size
+
         folder = datetime.now().strftime(const.DT_PATH_FORMAT)  # Regular case
-        files = self._get_files(folder)
+        names, sizes = self._get_files(folder)
         position = -2
-        if len(files) > 1:
-            file = files[position].split()  # [size, file]
-            size = int(file[0])
+        if len(names) > 1:
+            size = sizes[position]
             if size < self.MIN_FILE_SIZE:
                 return '', 0
 
-            path = f'{self._cam_path}/{folder}/{file[1]}'
+            path = f'{self._cam_path}/{folder}/{names[position]}'
             return path, size
 
-        elif files:
+        elif names:
             position = -1
 
         folder = (datetime.now() - timedelta(minutes=1)).strftime(const.DT_PATH_FORMAT)  # Possible case
         return self._get_file(folder, position)
 
+    def _get_path_by_epoch(self, epoch: int) -> str:
+        path = self._get_path_by_datetime(datetime.fromtimestamp(epoch).strftime(const.DT_WEB_FORMAT))
+        return f'{self._cam_path}/{path}'
+
     @staticmethod
     def _get_path_by_datetime(dt: str) -> str:
         if not re.match(r'^\d{14}$', dt):
             return ''
         return f'{dt[0:4]}-{dt[4:6]}-{dt[6:8]}/{dt[8:10]}/{dt[10:12]}/{dt[12:14]}.mp4'
-
-    @staticmethod
-    def _exec(cmd: str, default: Any = '') -> Any:
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True, shell=True)
-        stdout, _stderr = p.communicate()
-        return stdout.strip() or default
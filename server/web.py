@@ -1,71 +1,215 @@
+import asyncio
+import os
 import ssl
 import re
 import json
 import time
 import mimetypes
-from os import path as os_path
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import traceback
+from email.parser import Parser
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.client import HTTPMessage
 from http.cookies import SimpleCookie
-from socketserver import ThreadingMixIn, BaseServer
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime
-from typing import Tuple
+from typing import Tuple, Callable, Any, Dict, Optional
 import const
 from _config import Config
 from auth import Auth
 from videos import Videos
 from images import Images
+from sprites import Sprites
+from mp4 import Mp4
 from share import Share
+from motions import Motions
+from template import Template
+from static import Static
+from metrics import Metrics
+from supervisor import Supervisor
+from profiler import Profiler
 from log import Log
 
 
 class Server:
+    TRAFFIC_REPORT_INTERVAL = 60
+
     @staticmethod
-    def run() -> None:
+    async def run() -> None:
+        """ Start one listener for all web clients on the running event loop
+        """
+        Static.load()
+        Auth.init()
+        Metrics.add_collector(Server._collect_metrics)
+
         context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         context.load_cert_chain(Config.ssl_certificate, Config.ssl_private_key)
 
-        web_server = ThreadingServer((Config.web_server_host, Config.web_server_port), Handler)
-        web_server.socket = context.wrap_socket(web_server.socket, server_side=True)
+        web_server = await asyncio.start_server(
+            Server._handle, Config.web_server_host, Config.web_server_port, ssl=context)
 
         Log.write(f'Serving HTTP on https://{Config.web_server_host}:{Config.web_server_port}/ ...')
 
+        report = asyncio.create_task(Server._report_traffic())
         try:
-            web_server.serve_forever()
-        except KeyboardInterrupt:
-            pass
-
-        web_server.server_close()
-        Log.write('Server stopped.')
+            async with web_server:
+                await web_server.serve_forever()
+        finally:
+            report.cancel()
+            Log.write('Server stopped.')
 
+    @staticmethod
+    def _collect_metrics():
+        for cam_hash, total in Share.cam_traffic.copy().items():
+            yield 'cams_sent_bytes_total', {'cam': cam_hash}, total
+        yield 'cams_bell_waiters', {}, Motions.count()
+        for cam_hash, jobs in Supervisor.status().items():
+            for job_name, info in jobs.items():
+                labels = {'cam': cam_hash, 'job': job_name}
+                yield 'cams_job_healthy', labels, int(info['healthy'])
+                yield 'cams_job_failures', labels, info['failures']
+                yield 'cams_job_duration_seconds', labels, info['duration']
+            if 'recorder' in jobs:
+                recorder = jobs['recorder']
+                if recorder['segment_age'] is not None:
+                    yield 'cams_recorder_segment_age_seconds', {'cam': cam_hash}, recorder['segment_age']
+                yield 'cams_recorder_restarts_total', {'cam': cam_hash}, recorder['restarts']
+                yield 'cams_recorder_freezes_total', {'cam': cam_hash}, recorder['freezes']
+                yield 'cams_storage_bytes', {'cam': cam_hash}, recorder['bytes']
 
-class ThreadingServer(ThreadingMixIn, HTTPServer):
-    pass
-
+    @staticmethod
+    async def _report_traffic() -> None:
+        """ Print bytes/s served per camera
+        """
+        prev_traffic = {}
+        while True:
+            await asyncio.sleep(Server.TRAFFIC_REPORT_INTERVAL)
+            rates = []
+            for cam_hash, total in Share.cam_traffic.copy().items():
+                rate = (total - prev_traffic.get(cam_hash, 0)) / Server.TRAFFIC_REPORT_INTERVAL
+                if rate:
+                    rates.append(f'{cam_hash} {round(rate / 1024)} KiB/s')
+                prev_traffic[cam_hash] = total
+            if rates:
+                Log.print(f'Web: traffic: {", ".join(rates)}')
 
-class Handler(BaseHTTPRequestHandler):
-    def __init__(self, request: bytes, client_address: Tuple[str, int], server: BaseServer):
-        super().__init__(request, client_address, server)
+    @staticmethod
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await Handler(reader, writer).handle()
+
+
+class Handler:
+    """ HTTP/1.1 connection handler.
+        Blocking file system work runs in the default executor, so the number of threads is bounded.
+    """
+    KEEP_ALIVE_TIMEOUT = 75
+    MAX_HEADERS = 100
+    IMMUTABLE_AGE = 120  # seconds since the last file modification, see Segments.MUTABLE_MINUTES
+    BELL_TIMEOUT = 60  # long polling
+    SSE_PING_INTERVAL = 30
+    SSE_RETRY = 10  # seconds before the client reconnects
+    VIDEO_ROUTES = ('live', 'next', 'range', 'motions', 'export')  # metrics labels
+    IMAGE_ROUTES = ('next', 'range', 'sprite')
+    QUERY_FORMATS = {  # video and image params, bad ones are answered with 400
+        'step': r'-?\d+', 'md': r'-?\d+', 'range': r'-?\d+', 'pos': r'-?\d+\.-?\d+', 'folder': r'\d+', 'hour': r'\d+',
+        'dt': r'\d{14}', 'from': r'\d{14}', 'to': r'\d{14}',
+    }
+    DATE_TIME_PARAMS = ('dt', 'from', 'to')
+    DATE_TIME_RANGE = ('19700101000000', '21000101000000')  # the epochs of the sizes files are uint32
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.rfile = reader
+        self.wfile = writer
+        self.client_address = writer.get_extra_info('peername')
+        self.command = ''
+        self.path = ''
+        self.request_version = ''
+        self.headers = HTTPMessage()
         self.hash = None
         self._query = None
+        self._route = ''  # metrics label
         self._videos = None
         self._images = None
+        self._headers_buffer = []
+        self._headers_sent = False
+        self._has_length = False
+        self._close_connection = True
 
-    def do_GET(self) -> None:
+    async def handle(self) -> None:
+        """ Serve requests until the client closes the connection
+        """
+        try:
+            while await self._read_request():
+                start = time.monotonic()
+                self._route = self.command  # specified by the router
+                self._headers_sent = False
+                try:
+                    if self.command == 'GET':
+                        await self.do_GET()
+                    elif self.command == 'POST':
+                        await self.do_POST()
+                    else:
+                        self._close_connection = True
+                        self._send_error(501)
+                except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    Log.write(f'Web: ERROR: {self.command} {urlparse(self.path).path} failed ({repr(e)})')
+                    Log.print(traceback.format_exc())
+                    self._close_connection = True
+                    if not self._headers_sent:
+                        self._send_error(500)
+                await self.wfile.drain()
+                Metrics.observe('cams_requests_seconds', {'route': self._route}, time.monotonic() - start)
+                if self._close_connection:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass  # client has gone
+        except Exception as e:
+            Log.write(f'Web: ERROR: request aborted ({repr(e)})')
+            Log.print(traceback.format_exc())
+        finally:
+            self.wfile.close()
+
+    async def do_GET(self) -> None:
         """ Router
             Possible GET params: ?<page|video|image|bell>=<val>[...]&hash=<hash>[...]
+            ?video=live&quality=low is the low quality live frame (see Config.preview_command)
+            ?bell=sse is the motions event stream, ?bell=1 is the long polling fallback
+            &profile=1 profiles the master's request, ?profiler=<summary|camera> controls the profiler
         """
-        self._init()
+        await self._init()
         self._query = parse_qs(urlparse(self.path).query)  # GET params (dict)
+        if 'profile' in self._query and self.auth.info() == Config.master_cam_hash:
+            return await Profiler.profile(f'web {self.path}', self._dispatch())
+        await self._dispatch()
 
+    async def _dispatch(self) -> None:
         if not self._query and self.path != '/':
-            return self._send_static(self.path)
+            self._route = 'static'
+            return await self._send_static(self.path)
 
         if not self._query and self.path == '/':
-            return self._send_page()  # index page
+            self._route = 'page'
+            return await self._send_page()  # index page
 
         if 'bell' in self._query:
-            return self._send_bell()
+            if self._query['bell'][0] == 'sse':
+                self._route = 'bell=sse'
+                return await self._send_bell_events()
+            self._route = 'bell'
+            return await self._send_bell()  # long polling fallback
+
+        if 'metrics' in self._query:
+            self._route = 'metrics'
+            return self._send_metrics()
+
+        if 'profiler' in self._query:
+            self._route = 'profiler'
+            return await self._send_profiler()
+
+        if not self._is_valid_query():
+            return self._send_error(400)
 
         if 'hash' not in self._query:
             return self._send_error()
@@ -77,46 +221,149 @@ class Handler(BaseHTTPRequestHandler):
             return self._send_error(403)  # Invalid auth
 
         if 'page' in self._query:
-            return self._send_page()  # authorized page
+            self._route = 'page'
+            return await self._send_page()  # authorized page
 
         if 'video' in self._query:
-            self._videos = Videos(self.hash)
-            return self._send_segment(*self._videos.get(self._query))
+            self._route = f'video={self._query["video"][0] if self._query["video"][0] in self.VIDEO_ROUTES else ""}'
+            if self.hash not in Config.cameras:
+                return self._send_error()  # group hash
+            self._videos = Videos.instance(self.hash)
+            if self._query['video'][0] == 'motions':
+                return self._send_json(await self._run(self._videos.get_motions, self._query))
+            if self._query['video'][0] == 'export':
+                return await self._send_export()
+            if self._query['video'][0] == 'live' and self._query.get('quality', [''])[0] == 'low':
+                self._route = 'video=live&quality=low'
+                return await self._send_preview(*await self._run(self._videos.get_preview))
+            return await self._send_segment(*await self._get_segment())
 
         if 'image' in self._query:
-            self._images = Images(self.hash)
-            return self._send_image(*self._images.get(self._query))
+            self._route = f'image={self._query["image"][0] if self._query["image"][0] in self.IMAGE_ROUTES else ""}'
+            if self._query['image'][0] == 'sprite':
+                return await self._send_sprite()
+            self._images = Images.instance(self.hash)
+            return await self._send_image(*await self._run(self._images.get, self._query))
 
         self._send_error()  # No valid route found
 
-    def do_POST(self) -> None:
+    async def do_POST(self) -> None:
         """ Auth form handler
         """
-        self._init()
+        await self._init()
 
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        auth_info = self.auth.login(post_data)
+        content_length = self.headers.get('Content-Length', '')
+        if not content_length.isdigit():
+            self._close_connection = True  # the body can't be skipped
+            return self._send_error(411 if not content_length else 400)
+        post_data = await self.rfile.readexactly(int(content_length))
+        try:
+            auth_info = self.auth.login(post_data)
+        except (ValueError, TypeError):
+            return self._send_error(400)  # not a JSON object
         if not auth_info:
             Log.write('Web: ERROR: invalid auth')
             return self._send_error(403)
 
         self.send_response(200)
         self.send_header('Set-Cookie', self._create_auth_cookie())
+        self.send_header('Content-Length', '0')
         self.end_headers()
         Log.write(f'Web: logged in: {auth_info}')
 
     def version_string(self) -> str:
-        """Overrides parent method."""
         return Config().web_server_name
 
-    def _init(self) -> None:
+    def send_response(self, code: int) -> None:
+        self._headers_buffer = [f'HTTP/1.1 {code} {HTTPStatus(code).phrase}\r\n']
+        self._has_length = code in (204, 304)
+        self.send_header('Server', self.version_string())
+        self.send_header('Date', formatdate(usegmt=True))
+
+    def send_header(self, keyword: str, value: str) -> None:
+        self._headers_buffer.append(f'{keyword}: {value}\r\n')
+        if keyword.lower() == 'content-length':
+            self._has_length = True
+
+    def end_headers(self) -> None:
+        if not self._has_length:
+            self._close_connection = True  # the body ends with the connection
+        if self._close_connection:
+            self._headers_buffer.append('Connection: close\r\n')
+        self._headers_buffer.append('\r\n')
+        self.wfile.write(''.join(self._headers_buffer).encode('latin-1', 'strict'))
+        self._headers_buffer = []
+        self._headers_sent = True
+
+    async def _read_request(self) -> bool:
+        try:
+            line = await asyncio.wait_for(self.rfile.readline(), self.KEEP_ALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        if not line:
+            return False
+
+        words = line.decode('iso-8859-1').rstrip('\r\n').split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            self._send_error(400)
+            return False
+        self.command, self.path, self.request_version = words
+
+        lines = []
+        while True:
+            line = await self.rfile.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            lines.append(line.decode('iso-8859-1'))
+            if len(lines) > self.MAX_HEADERS:
+                self._send_error(431)
+                return False
+        self.headers = Parser(_class=HTTPMessage).parsestr(''.join(lines))
+
+        connection = self.headers.get('Connection', '').lower()
+        if self.request_version == 'HTTP/1.1':
+            self._close_connection = connection == 'close'
+        else:
+            self._close_connection = connection != 'keep-alive'
+        return True
+
+    @staticmethod
+    async def _run(func: Callable, *args) -> Any:
+        """ Run blocking code (file system, subprocesses) in the default executor
+        """
+        start = time.monotonic()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+        finally:
+            Metrics.observe('cams_steps_seconds', {'step': func.__qualname__}, time.monotonic() - start)
+
+    async def _init(self) -> None:
         self.cookie = SimpleCookie()
         raw_cookies = self.headers.get('Cookie')
         if raw_cookies:
             self.cookie.load(raw_cookies)
 
-        self.auth = Auth(self.cookie['auth'].value if 'auth' in self.cookie else None)
+        cookie = self.cookie['auth'].value if 'auth' in self.cookie else None
+        if cookie and Auth.is_legacy(cookie):
+            self.auth = await self._run(Auth, cookie)  # openssl subprocess
+            return
+        start = time.monotonic()
+        self.auth = Auth(cookie)
+        Metrics.observe('cams_steps_seconds', {'step': 'Auth.decrypt'}, time.monotonic() - start)
+
+    def _is_valid_query(self) -> bool:
+        for key, pattern in self.QUERY_FORMATS.items():
+            if key in self._query and not re.fullmatch(pattern, self._query[key][0]):
+                return False
+        for key in self.DATE_TIME_PARAMS:
+            if key in self._query:
+                if not self.DATE_TIME_RANGE[0] <= self._query[key][0] < self.DATE_TIME_RANGE[1]:
+                    return False
+                try:
+                    datetime.strptime(self._query[key][0], const.DT_WEB_FORMAT)
+                except ValueError:
+                    return False
+        return True
 
     def _get_client_type(self) -> str:
         host = self.headers.get('Host').split(':')[0]
@@ -124,25 +371,43 @@ class Handler(BaseHTTPRequestHandler):
             return 'local'
         return 'web'
 
-    def _send_static(self, static_file: str) -> None:
+    async def _send_static(self, static_file: str) -> None:
         if not re.search(r'^/([a-z]+/)*[a-z\d._]+$', static_file):
             return self._send_error()
-        try:
-            with open(f'{os_path.dirname(os_path.realpath(__file__))}/../client{static_file}', 'rb') as file:
-                mime_type, _enc = mimetypes.MimeTypes().guess_type(static_file)
-                self.send_response(200)
-                self.send_header('Content-Type', mime_type)
-                self.end_headers()
-                if static_file == '/cams.webmanifest':
-                    title = Config.web_title if self._get_client_type() == 'web' else Config.title
-                    self.wfile.write(file.read().replace('{title}'.encode('UTF-8'), title.encode('UTF-8')))
-                    return
-                self.wfile.write(file.read())
-        except Exception as e:
-            Log.write(f"Web: ERROR: can't open static file {static_file} ({repr(e)})")
-            self._send_error()
+        file = Static.get(static_file, self._get_client_type())
+        if not file:
+            Log.write(f"Web: ERROR: can't open static file {static_file}")
+            return self._send_error()
+
+        content, etag = file.content, file.etag
+        if file.gzip and self._accepts_gzip():
+            content, etag = file.gzip, f'{etag[:-1]}-gz"'
+
+        if self._is_not_modified(etag, file.mtime):
+            self.send_response(304)
+            content = b''
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', file.mime_type)
+            if content is file.gzip:
+                self.send_header('Content-Encoding', 'gzip')
+        if file.gzip:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(file.mtime, usegmt=True))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _accepts_gzip(self) -> bool:
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _sep, params = coding.partition(';')
+            if name.strip().lower() in ('gzip', '*'):
+                return not re.search(r'q=0(\.0*)?\s*$', params.strip())
+        return False
 
-    def _send_page(self) -> None:
+    async def _send_page(self) -> None:
         page = self._query['page'][0] if self._query else 'index'
         if page not in ['index', 'cam', 'group', 'events']:
             return self._send_error()
@@ -151,23 +416,25 @@ class Handler(BaseHTTPRequestHandler):
         if not self.auth.info():
             template = '/auth.html'
         try:
-            with open(f'{os_path.dirname(os_path.realpath(__file__))}/../client/layout.html', 'rb') as file:
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.send_header('Set-Cookie', self._create_auth_cookie())
-                self.end_headers()
-                self.wfile.write(self._replace_template(template, file.read()))
+            content = await self._run(self._replace_template, template)
         except Exception as e:
             Log.write(f'Web: ERROR: page "{page}" not found ({repr(e)})')
-            self._send_error()
+            return self._send_error()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Set-Cookie', self._create_auth_cookie())
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
 
     def _create_auth_cookie(self) -> str:
         return (
             f'auth={self.auth.encrypt(self.auth.info())}; '
             'Path=/; Max-Age=3456000; Secure; HttpOnly; SameSite=Lax')
 
-    def _replace_template(self, template: str, content: bytes) -> bytes:
-        content = content.replace('{content}'.encode('UTF-8'), self._get_content(template))
+    def _replace_template(self, template: str) -> bytes:
+        values = {}
         title = Config.title
 
         cams_list = {}
@@ -190,25 +457,18 @@ class Handler(BaseHTTPRequestHandler):
                     if self.auth.info() == Config.master_cam_hash:
                         groups_list[k] = {'name': v['name']}
 
-            content = content.replace(
-                '{cams}'.encode('UTF-8'), json.dumps(cams_list).encode('UTF-8')
-            ).replace(
-                '{groups}'.encode('UTF-8'), json.dumps(groups_list).encode('UTF-8')
-            )
+            values['cams'] = json.dumps(cams_list).encode('UTF-8')
+            values['groups'] = json.dumps(groups_list).encode('UTF-8')
         elif template == '/cam.html':
             if self.hash not in cams_list:
                 return b''
-            videos = Videos(self.hash)
+            videos = Videos.instance(self.hash)
             cam = Config.cameras[self.hash]
             title = cam['name']
             events_hidden = 'hidden' if not cams_list[self.hash]['events'] else ''
-            content = content.replace(
-                '{days}'.encode('UTF-8'), json.dumps(videos.get_days()).encode('UTF-8')
-            ).replace(
-                '{cam_info}'.encode('UTF-8'), json.dumps(cams_list[self.hash]).encode('UTF-8')
-            ).replace(
-                '{events_hidden}'.encode('UTF-8'), events_hidden.encode('UTF-8')
-            )
+            values['days'] = json.dumps(videos.get_days()).encode('UTF-8')
+            values['cam_info'] = json.dumps(cams_list[self.hash]).encode('UTF-8')
+            values['events_hidden'] = events_hidden.encode('UTF-8')
         elif template == '/group.html':
             cams = {}
             for cam_hash in Config.groups[self.hash]['cams']:
@@ -216,22 +476,18 @@ class Handler(BaseHTTPRequestHandler):
                     cams[cam_hash] = cams_list[cam_hash]
             if hasattr(Config, 'groups'):
                 title = Config.groups[self.hash]['name']
-            content = content.replace(
-                '{cams}'.encode('UTF-8'), json.dumps(cams).encode('UTF-8')
-            )
+            values['cams'] = json.dumps(cams).encode('UTF-8')
         elif template == '/events.html':
             if self.hash not in cams_list:
                 return b''
-            images = Images(self.hash)
+            images = Images.instance(self.hash)
             cam = Config.cameras[self.hash]
             title = cam['name']
-            content = content.replace(
-                '{cam_info}'.encode('UTF-8'), json.dumps(cams_list[self.hash]).encode('UTF-8')
-            ).replace(
-                '{chart_data}'.encode('UTF-8'), json.dumps(images.get_chart_data()).encode('UTF-8')
-            )
-        content = content.replace('{bell_hidden}'.encode('UTF-8'), bell_hidden.encode('UTF-8'))
-        return content.replace('{title}'.encode('UTF-8'), title.encode('UTF-8'))
+            values['cam_info'] = json.dumps(cams_list[self.hash]).encode('UTF-8')
+            values['chart_data'] = json.dumps(images.get_chart_data()).encode('UTF-8')
+        values['bell_hidden'] = bell_hidden.encode('UTF-8')
+        values['title'] = title.encode('UTF-8')
+        return Template.get(template).render(values)
 
     @staticmethod
     def _get_bell_time(cam_hash) -> str:
@@ -242,49 +498,115 @@ class Handler(BaseHTTPRequestHandler):
             return ''
         return last_bell_datetime.strftime('%H:%M')
 
-    @staticmethod
-    def _get_content(template: str) -> bytes:
-        try:
-            with open(f'{os_path.dirname(os_path.realpath(__file__))}/../client{template}', 'rb') as file:
-                return file.read()
-        except Exception as e:
-            Log.write(f'Web: ERROR: template "{template}" not found ({repr(e)})')
+    async def _get_segment(self) -> Tuple[str, int, bool]:
+        """ Live requests wait (without blocking a thread) for the segment the client doesn't have yet
+        """
+        query_date_time = self._query['dt'][0] if 'dt' in self._query else ''
+        deadline = time.monotonic() + Videos.LIVE_TIMEOUT
+        while True:
+            file_path, file_size, live = await self._run(self._videos.get, self._query)
+            timeout = deadline - time.monotonic()
+            if file_size or not live or timeout <= 0:
+                return file_path, file_size, live
+            Metrics.inc('cams_live_waiters')
+            try:
+                if not await self._videos.wait_live(query_date_time, timeout):
+                    return file_path, file_size, live
+            finally:
+                Metrics.inc('cams_live_waiters', value=-1)
 
-    def _send_segment(self, file_path: str, file_size: int) -> None:
+    async def _send_segment(self, file_path: str, file_size: int, live: bool) -> None:
         query_date_time = self._query['dt'][0] if 'dt' in self._query else ''
         file_date_time = self._videos.get_datetime_by_path(file_path)
         try:
-            self.send_response(200)
             if file_path and file_size and query_date_time != file_date_time:
-                self.send_header('Content-Type', 'video/mp4')
-                self.send_header('Content-Length', str(file_size))
-                self.send_header('Cache-Control', 'no-store')
-                self.send_header('X-Datetime', file_date_time)
-                self.send_header('X-Range', self._videos.get_range_by_path(file_path))
-                self.end_headers()
-                with open(file_path, 'rb') as video_file:
-                    self.wfile.write(video_file.read())
+                rng = str(const.MAX_RANGE + 1) if live else self._videos.get_range_by_path(file_path)
+                if live:
+                    cache_control = 'no-store'  # live
+                elif self._query['video'][0] == 'range':
+                    cache_control = 'private, no-cache'  # depends on the archive start, revalidate
+                else:
+                    cache_control = 'private, max-age=86400, immutable'
+                await self._send_file(file_path, 'video/mp4', cache_control, {'X-Datetime': file_date_time, 'X-Range': rng})
             else:
+                self.send_response(204)  # nothing new, the client will retry
                 self.end_headers()
         except Exception as e:
+            self._close_connection = True
             Log.write(f'Web: request aborted ({repr(e)})')
 
-    def _send_image(self, file_path: str, file_size: int, position: str, rng: int) -> None:
+    async def _send_preview(self, file_path: str, file_size: int, file_date_time: str) -> None:
+        if not file_path or not file_size:
+            return self._send_error()  # disabled or frozen, the client plays the full stream
         try:
-            mime_type, _enc = mimetypes.MimeTypes().guess_type(file_path)
-            self.send_response(200)
-            self.send_header('Content-Type', mime_type)
-            self.send_header('Content-Length', str(file_size))
-            self.send_header('Cache-Control', 'no-store')
-            self.send_header('X-Range', str(rng))
-            self.send_header('X-Position', position)
-            self.end_headers()
-            with open(file_path, 'rb') as video_file:
-                self.wfile.write(video_file.read())
+            await self._send_file(file_path, 'image/jpeg', 'private, no-cache', {'X-Datetime': file_date_time})
+        except Exception as e:
+            self._close_connection = True
+            Log.write(f'Web: request aborted ({repr(e)})')
+
+    async def _send_image(self, file_path: str, file_size: int, position: str, rng: int) -> None:
+        try:
+            if not file_path or not file_size:
+                self.send_response(204)  # same position, save some traffic
+                self.end_headers()
+                return
+            mime_type, _enc = mimetypes.guess_type(file_path)
+            # Positions are shifted by the events rotation, so revalidate
+            await self._send_file(file_path, mime_type, 'private, no-cache', {'X-Range': str(rng), 'X-Position': position})
         except Exception as e:
+            self._close_connection = True
             Log.write(f'Web: request aborted ({repr(e)})')
 
-    def _send_bell(self) -> None:
+    async def _send_sprite(self) -> None:
+        """ ?image=sprite&folder=<idx> is the folder sheets index, ?image=sprite&folder=<idx>&hour=<HH> is the sheet
+        """
+        if self.hash not in Config.cameras or 'folder' not in self._query or not self._query['folder'][0].isdigit():
+            return self._send_error()
+        sprites = Sprites.instance(self.hash)
+        folder_idx = int(self._query['folder'][0])
+        if 'hour' not in self._query:
+            return self._send_json(await self._run(sprites.get_index, folder_idx))
+        file_path = await self._run(sprites.get_path, folder_idx, self._query['hour'][0])
+        if not file_path:
+            return self._send_error()
+        try:
+            await self._send_file(file_path, 'image/jpeg', 'private, no-cache', {})
+        except Exception as e:
+            self._close_connection = True
+            Log.write(f'Web: request aborted ({repr(e)})')
+
+    async def _send_export(self) -> None:
+        """ ?video=export&from=<dt>[&to=<dt>] is the segments joined into one fragmented MP4 file.
+            The segments are read one by one, the length is unknown, so the body ends with the connection.
+        """
+        paths = await self._run(self._videos.get_export, self._query)
+        if not paths:
+            return self._send_error()
+
+        file_name = f'{Config.cameras[self.hash]["folder"]}-{self._videos.get_datetime_by_path(paths[0])}.mp4'
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        mp4 = Mp4()
+        sent = 0
+        for path in paths:
+            try:
+                chunks = await self._run(mp4.read, path)
+            except OSError as e:  # removed by the retention
+                Log.print(f'Web: export: skip {path} ({repr(e)})')
+                continue
+            if not chunks:
+                Log.print(f'Web: export: {path} differs from the first segment, stop')
+                break
+            for chunk in chunks:
+                self.wfile.write(chunk)
+                sent += len(chunk)
+            await self.wfile.drain()
+        Share.cam_traffic[self.hash] = Share.cam_traffic.get(self.hash, 0) + sent
+
+    async def _send_bell(self) -> None:
         if not self.auth.info():
             return self._send_error(403)
 
@@ -294,35 +616,211 @@ class Handler(BaseHTTPRequestHandler):
             last_date_time = ''
             Log.write(f'Web bell: send query ERROR {repr(e)}')
 
-        prev_motions = Share.cam_motions.copy()
-        cnt = 0
-        time.sleep(1)
-        while True:
-            res = {}
-            for cam_hash, date_time in Share.cam_motions.items():
+        res = {}
+        queue = Motions.subscribe()
+        deadline = time.monotonic() + self.BELL_TIMEOUT
+        try:
+            while not res:
+                try:
+                    cam_hash, date_time = await asyncio.wait_for(queue.get(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
                 if self.auth.info() != Config.master_cam_hash and self.auth.info() != cam_hash:
                     continue
                 if last_date_time >= date_time:
                     continue
-                if cam_hash in prev_motions and prev_motions[cam_hash] >= date_time:
-                    continue
                 res[cam_hash] = {'dt': date_time, 'name': Config.cameras[cam_hash]["name"]}
+        finally:
+            Motions.unsubscribe(queue)
 
-            cnt += 1
-            if not res and cnt < 60:
-                time.sleep(1)
-                continue
+        try:
+            self._send_json(res)
+        except Exception as e:
+            Log.write(f'Web bell: send ERROR {repr(e)}')
 
-            try:
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(res).encode('UTF-8'))
-            except Exception as e:
-                Log.write(f'Web bell: send ERROR {repr(e)}')
+    async def _send_bell_events(self) -> None:
+        """ Server-sent events stream of the motions, the event id is the last motion date time
+        """
+        if not self.auth.info():
+            return self._send_error(403)
 
-            return
+        queue = Motions.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            self.wfile.write(f'retry: {self.SSE_RETRY * 1000}\n\n'.encode())
+
+            # Motions missed while reconnecting
+            last_date_time = self.headers.get('Last-Event-ID') or self._query.get('dt', [''])[0]
+            if last_date_time:
+                for cam_hash, date_time in Share.cam_motions.copy().items():
+                    if date_time > last_date_time:
+                        queue.put_nowait((cam_hash, date_time))
+
+            while True:
+                await self.wfile.drain()
+                try:
+                    motions = [await asyncio.wait_for(queue.get(), self.SSE_PING_INTERVAL)]
+                except asyncio.TimeoutError:
+                    self.wfile.write(b': ping\n\n')  # also detects gone clients
+                    continue
+                while not queue.empty():
+                    motions.append(queue.get_nowait())
+
+                res = {}
+                for cam_hash, date_time in motions:
+                    if self.auth.info() != Config.master_cam_hash and self.auth.info() != cam_hash:
+                        continue
+                    res[cam_hash] = {'dt': date_time, 'name': Config.cameras[cam_hash]['name']}
+                if res:
+                    last_date_time = max(row['dt'] for row in res.values())
+                    self.wfile.write(f'id: {last_date_time}\ndata: {json.dumps(res)}\n\n'.encode('UTF-8'))
+        finally:
+            Motions.unsubscribe(queue)
+
+    def _send_metrics(self) -> None:
+        """ Prometheus text format, for the master only (scrapers send the master's auth cookie)
+        """
+        if self.auth.info() != Config.master_cam_hash:
+            return self._send_error(403)
+        content = Metrics.render().encode('UTF-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    async def _send_profiler(self) -> None:
+        """ ?profiler=summary[&name=<part of the profile names>] is the top functions of the saved profiles,
+            ?profiler=camera[&hash=<cam hash>][&seconds=<duration>] profiles the camera jobs (all without hash)
+        """
+        if self.auth.info() != Config.master_cam_hash:
+            return self._send_error(403)
+        action = self._query['profiler'][0]
+        if action == 'summary':
+            content = (await self._run(Profiler.summary, self._query.get('name', [''])[0])).encode('UTF-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif action == 'camera':
+            cam_hash = self._query.get('hash', [Profiler.ALL])[0]
+            seconds = self._query.get('seconds', [''])[0]
+            seconds = int(seconds) if seconds.isdigit() else Profiler.SECONDS
+            if cam_hash != Profiler.ALL and cam_hash not in Config.cameras:
+                return self._send_error()
+            Profiler.enable(cam_hash, seconds)
+            self._send_json({'camera': cam_hash, 'seconds': seconds})
+        else:
+            self._send_error()
+
+    def _send_json(self, data: Any) -> None:
+        content = json.dumps(data).encode('UTF-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
 
     def _send_error(self, code: int = 404) -> None:
         self.send_response(code)
+        self.send_header('Content-Length', '0')
         self.end_headers()
+
+    async def _send_file(self, file_path: str, mime_type: str, cache_control: str, headers: Dict[str, str]) -> None:
+        """ Send the file with validators, conditional (304) and partial (206) responses support.
+            The file isn't read into memory: os.sendfile is used for plain sockets,
+            chunked readinto a reused buffer for TLS ones (see loop.sendfile).
+        """
+        with open(file_path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if 'no-store' not in cache_control and stat.st_mtime > time.time() - self.IMMUTABLE_AGE:
+                cache_control = 'private, no-cache'  # the file may still be written
+
+            if self._is_not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                self._send_file_headers(etag, stat.st_mtime, cache_control, headers)
+                self.end_headers()
+                return
+
+            byte_range = self._get_byte_range(stat.st_size, etag, stat.st_mtime)
+            if not byte_range:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            start, end = byte_range
+            count = end - start + 1
+            self.send_response(206 if count < stat.st_size else 200)
+            self.send_header('Content-Type', mime_type)
+            self.send_header('Content-Length', str(count))
+            if count < stat.st_size:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+            self._send_file_headers(etag, stat.st_mtime, cache_control, headers)
+            self.end_headers()
+            if not count:
+                return
+
+            send_start = time.monotonic()
+            sent = await asyncio.get_event_loop().sendfile(self.wfile.transport, file, start, count)
+            Metrics.observe('cams_steps_seconds', {'step': 'sendfile'}, time.monotonic() - send_start)
+        if sent < count:
+            self._close_connection = True  # Content-Length can't be satisfied
+        Share.cam_traffic[self.hash] = Share.cam_traffic.get(self.hash, 0) + sent
+
+    def _send_file_headers(self, etag: str, mtime: float, cache_control: str, headers: Dict[str, str]) -> None:
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Cache-Control', cache_control)
+        if 'no-store' not in cache_control:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        for keyword, value in headers.items():
+            self.send_header(keyword, value)
+
+    def _is_not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        return self._is_modified_since(self.headers.get('If-Modified-Since'), mtime) is False
+
+    def _get_byte_range(self, size: int, etag: str, mtime: float) -> Optional[Tuple[int, int]]:
+        """ Returns the requested (start, end) bytes, the whole file by default, or None if unsatisfiable
+        """
+        whole = (0, size - 1)
+        match = re.match(r'^bytes=(\d*)-(\d*)$', self.headers.get('Range', '').strip())
+        if not match or not size or (not match.group(1) and not match.group(2)):
+            return whole  # no range, multiple ranges aren't supported too
+
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range.strip() != etag and self._is_modified_since(if_range, mtime) is not False:
+            return whole  # the client has another version
+
+        if not match.group(1):  # suffix: last N bytes
+            if not int(match.group(2)):
+                return None
+            return max(0, size - int(match.group(2))), size - 1
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start >= size or start > end:
+            return None
+        return start, end
+
+    @staticmethod
+    def _is_modified_since(http_date: Optional[str], mtime: float) -> Optional[bool]:
+        if not http_date:
+            return None
+        try:
+            return int(mtime) > parsedate_to_datetime(http_date).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return None
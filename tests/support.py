@@ -0,0 +1,59 @@
+""" Test helpers: the server modules are imported from server/ with a temporary _config module
+"""
+import os
+import sys
+import tempfile
+import types
+from datetime import datetime
+from typing import Dict
+
+SERVER_PATH = os.path.realpath(f'{os.path.dirname(os.path.realpath(__file__))}/../server')
+CAM_HASH = 'cam1'
+ROOT = tempfile.mkdtemp(prefix='cams-pwa-tests-')
+
+
+class Config:
+    cameras: Dict[str, Dict] = {}
+    groups: Dict[str, Dict] = {}
+    master_cam_hash = 'master'
+    encryption_key = 'Tests Encryption Key'
+    storage_path = f'{ROOT}/storage'
+    events_path = f'{ROOT}/events'
+    storage_period_days = 1
+    events_period_days = 1
+    storage_enabled = False
+    events_enabled = False
+    min_segment_duration = 4
+    log_file = f'{ROOT}/cams-pwa.log'
+    debug = False
+    preview_command = ''
+
+
+if SERVER_PATH not in sys.path:
+    sys.path.insert(0, SERVER_PATH)
+if '_config' not in sys.modules:
+    module = types.ModuleType('_config')
+    module.Config = Config
+    sys.modules['_config'] = module
+
+
+def set_camera(name: str) -> str:
+    """ New camera folder (the server modules keep per-camera singletons, so every test has its own camera)
+    """
+    Config.cameras[name] = {'folder': name, 'name': name, 'url': '', 'sensitivity': 1.5, 'events': True}
+    return name
+
+
+def make_segments(cam_folder: str, start: datetime, minutes: int, sizes=None, per_minute: int = 15) -> None:
+    """ Segments of the given minutes, 4 seconds each, sizes are taken in order (cycled)
+    """
+    sizes = sizes or [10000]
+    i = 0
+    for minute in range(minutes):
+        moment = datetime.fromtimestamp(start.timestamp() + minute * 60)
+        path = f'{Config.storage_path}/{cam_folder}/{moment.strftime("%Y-%m-%d/%H/%M")}'
+        os.makedirs(path, exist_ok=True)
+        for second in range(0, 60, 60 // per_minute):
+            with open(f'{path}/{second:02d}.mp4', 'wb') as file:
+                file.truncate(sizes[i % len(sizes)])
+            i += 1
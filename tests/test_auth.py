@@ -0,0 +1,27 @@
+import unittest
+import support
+from support import Config
+from auth import Auth
+
+
+class AuthTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera('auth')
+
+    def test_token(self):
+        self.assertEqual(Auth(Auth.encrypt(self.cam_hash)).info(), self.cam_hash)
+        self.assertEqual(Auth(Auth.encrypt(Config.master_cam_hash)).info(), Config.master_cam_hash)
+        self.assertIsNone(Auth(Auth.encrypt('unknown')).info())
+
+    def test_invalid_tokens(self):
+        token = Auth.encrypt(self.cam_hash)
+        for cookie in ('v1.YzE.%C3%A9', 'v1.%C3%A9.abc', 'v1.YzE.abc', token[:-2], 'v1..', 'garbage', ''):
+            self.assertIsNone(Auth(cookie).info(), cookie)
+
+    def test_legacy(self):
+        self.assertFalse(Auth.is_legacy(Auth.encrypt(self.cam_hash)))
+        self.assertTrue(Auth.is_legacy('U2FsdGVkX19abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import unittest
+from datetime import datetime
+import support
+from support import Config
+from images import Images
+
+
+class ImagesTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        self.path = f'{Config.events_path}/{self.cam_hash}/live'
+        os.makedirs(self.path)
+        self.images = Images.instance(self.cam_hash)
+
+    def test_uploaded_image_size_is_updated(self):
+        name = f'{datetime.now().strftime("%Y%m%d%H%M%S")}00.jpg'
+        open(f'{self.path}/{name}', 'wb').close()  # the upload is started
+        folder_mtime = os.stat(self.path).st_mtime_ns
+        self.assertEqual(self.images.get_files('live'), ([name], [0]))
+
+        with open(f'{self.path}/{name}', 'wb') as file:
+            file.write(b'\xff' * 5000)
+        os.utime(self.path, ns=(folder_mtime, folder_mtime))  # writing into a file doesn't change the folder
+        self.assertEqual(self.images.get_files('live'), ([name], [5000]))
+
+    def test_settled_images_are_not_restated(self):
+        name = '2020010100000000.jpg'
+        with open(f'{self.path}/{name}', 'wb') as file:
+            file.write(b'\xff' * 100)
+        os.utime(f'{self.path}/{name}', (0, 0))
+        self.assertEqual(self.images.get_files('live'), ([name], [100]))
+        self.assertFalse(self.images._files['live'][3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import queue
+import unittest
+from contextlib import redirect_stderr
+import support  # noqa: F401 (the server path and _config)
+from log import Log
+
+
+class FlakyFile(io.StringIO):
+    def __init__(self, fail: bool):
+        super().__init__()
+        self._fail = fail
+
+    def write(self, line: str) -> int:
+        if self._fail:
+            raise OSError(28, 'No space left on device')
+        return super().write(line)
+
+
+class FlakyLog(Log):
+    """ The writer is run in the test thread, the first file fails
+    """
+    REOPEN_INTERVAL = 0
+    _queue = queue.Queue(Log.MAX_QUEUE)
+    _dropped = 0
+    files = []
+
+    @staticmethod
+    def _open():
+        FlakyLog.files.append(FlakyFile(fail=not FlakyLog.files))
+        return FlakyLog.files[-1]
+
+
+class LogTest(unittest.TestCase):
+    def test_writer_survives_write_errors(self):
+        FlakyLog._dropped = 2
+        for info in ('first', 'second', None):
+            FlakyLog._queue.put((0, info) if info else None)
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            FlakyLog._writer()  # returns on None
+
+        self.assertIn("can't write", stderr.getvalue())
+        self.assertIn('2 lines dropped', stderr.getvalue())
+        self.assertEqual(len(FlakyLog.files), 2)
+        self.assertIn('first', stderr.getvalue())  # the file is reopened on the next line
+        self.assertIn('second', FlakyLog.files[1].getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
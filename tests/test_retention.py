@@ -0,0 +1,44 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+import support
+from support import Config
+from retention import Retention
+from videos import Videos
+
+
+class RetentionTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        now = datetime.now()
+        self.old = (now - timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.kept = (now - timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        support.make_segments(self.cam_hash, self.old, 3)
+        support.make_segments(self.cam_hash, self.kept, 2)
+        self.videos = Videos.instance(self.cam_hash)
+
+    def test_removed_segments_are_not_found(self):
+        # fill the index with the folders to remove
+        before = (self.old - timedelta(minutes=1)).strftime('%Y%m%d%H%M%S')
+        path, _size, _live = self.videos.get({'video': ['next'], 'step': ['1'], 'dt': [before]})
+        self.assertIn(self.old.strftime('%Y-%m-%d/%H/%M'), path)
+
+        self.assertEqual(Retention.instance(self.cam_hash).evict(), 3)
+        self.assertFalse(os.path.exists(path))
+
+        path, size, _live = self.videos.get({'video': ['next'], 'step': ['1'], 'dt': [before]})
+        self.assertTrue(path.endswith(f'{self.kept.strftime("%Y-%m-%d/%H/%M")}/00.mp4'), path)
+        self.assertTrue(os.path.isfile(path))
+        path, size, _live = self.videos.get({'video': ['range'], 'range': ['0']})
+        self.assertTrue(path.endswith(f'{self.kept.strftime("%Y-%m-%d/%H/%M")}/00.mp4'), path)
+        self.assertEqual(size, 10000)
+
+    def test_bytes_are_counted_from_disk(self):
+        retention = Retention.instance(self.cam_hash)
+        retention.evict()
+        self.assertEqual(retention.get_bytes(), 2 * 15 * 10000)
+        self.assertTrue(os.path.isdir(f'{Config.storage_path}/{self.cam_hash}/{self.kept.strftime("%Y-%m-%d")}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
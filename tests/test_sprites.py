@@ -0,0 +1,66 @@
+import asyncio
+import os
+import unittest
+from typing import List
+import support
+from support import Config
+from sprites import Sprites
+
+
+class FakeSprites(Sprites):
+    """ ffmpeg is replaced by writing the output files
+    """
+    def __init__(self, camera_hash: str):
+        super().__init__(camera_hash)
+        self.commands: List[List[str]] = []
+
+    async def _ffmpeg(self, name: str, args: List[str]) -> bool:
+        self.commands.append(args)
+        for output in [arg for arg in args if arg.endswith('.tmp.jpg')]:
+            if 'bad-image' not in output:
+                open(output, 'wb').close()
+        return not any('bad-image' in arg for arg in args)
+
+
+class SpritesTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        self.path = f'{Config.events_path}/{self.cam_hash}/live'
+        os.makedirs(self.path)
+        self.sprites = FakeSprites(self.cam_hash)
+
+    def add_image(self, name: str) -> None:
+        with open(f'{self.path}/{name}', 'wb') as file:
+            file.write(b'\xff' * 100)
+        os.utime(f'{self.path}/{name}', (1e9, 1e9))  # the same hour
+
+    def test_only_changed_hours_and_new_thumbnails_are_made(self):
+        for i in range(3):
+            self.add_image(f'2001090901464{i}00.jpg')
+        asyncio.run(self.sprites.check())
+        self.assertEqual(len(self.sprites.commands), 2)  # thumbnails and the sheet
+        self.assertEqual(self.sprites.commands[0].count('-i'), 3)
+        index = self.sprites.get_index(0)
+        self.assertEqual((index[0]['first'], index[0]['last'], index[0]['cells']), (0, 2, [0, 1, 2]))
+
+        asyncio.run(self.sprites.check())
+        self.assertEqual(len(self.sprites.commands), 2)  # nothing is changed
+
+        self.add_image('2001090901464300.jpg')
+        asyncio.run(self.sprites.check())
+        self.assertEqual(len(self.sprites.commands), 4)
+        self.assertEqual(self.sprites.commands[2].count('-i'), 1)  # only the new image is scaled
+        self.assertEqual(self.sprites.get_index(0)[0]['cells'], [0, 1, 2, 3])
+
+        # the index is read from the json files after the restart
+        self.assertEqual(FakeSprites(self.cam_hash).get_index(0), self.sprites.get_index(0))
+
+    def test_bad_image_is_skipped(self):
+        self.add_image('2001090901464000.jpg')
+        self.add_image('2001090901464100bad-image.jpg')
+        asyncio.run(self.sprites.check())
+        self.assertEqual(self.sprites.get_index(0)[0]['cells'], [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+import support
+from videos import Videos
+
+
+class MotionSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        self.minute = (datetime.now() - timedelta(hours=2)).replace(second=0, microsecond=0)
+        # the previous minute folder starts the average: 5 large segments and 10 small ones
+        prev = [300000] * 5 + [100000] * 10
+        current = [100000, 200000, 100000, 300000] + [100000] * 11
+        support.make_segments(self.cam_hash, self.minute - timedelta(minutes=1), 2, prev + current)
+        self.videos = Videos.instance(self.cam_hash)
+
+    def get(self, step: int, date_time: datetime) -> str:
+        args = {'video': ['next'], 'step': [str(step)], 'md': ['50'], 'dt': [date_time.strftime('%Y%m%d%H%M%S')]}
+        path, _size, _live = self.videos.get(args)
+        return path[-len('YYYY-MM-DD/HH/MM/SS.mp4'):]
+
+    def test_average_of_the_whole_previous_minute(self):
+        # 200000 is above 1.5 of the last 10 segments average, but not of the whole previous minute (15 segments)
+        self.assertEqual(self.get(4, self.minute), f'{self.minute.strftime("%Y-%m-%d/%H/%M")}/12.mp4')
+
+    def test_backward(self):
+        after = self.minute + timedelta(seconds=56)
+        self.assertEqual(self.get(-4, after), f'{self.minute.strftime("%Y-%m-%d/%H/%M")}/12.mp4')
+
+    def test_motions_use_the_same_average(self):
+        args = {'from': [self.minute.strftime('%Y%m%d%H%M%S')], 'md': ['50'],
+                'to': [(self.minute + timedelta(seconds=59)).strftime('%Y%m%d%H%M%S')]}
+        motions = self.videos.get_motions(args)
+        self.assertEqual([m['dt'] for m in motions], [(self.minute + timedelta(seconds=12)).strftime('%Y%m%d%H%M%S')])
+
+
+class MotionsTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        self.videos = Videos.instance(self.cam_hash)
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.videos.get_motions({'video': ['motions']}), [])  # no archive
+        support.make_segments(self.cam_hash, datetime.now() - timedelta(hours=1), 2)
+        for args in ({'from': ['yesterday']}, {'to': ['2020']}, {'md': ['high']}):
+            self.assertEqual(self.videos.get_motions({'video': ['motions'], **args}), [], args)
+
+
+class NearestFileTest(unittest.TestCase):
+    def setUp(self):
+        self.cam_hash = support.set_camera(self.id().split('.')[-1])
+        self.videos = Videos.instance(self.cam_hash)
+
+    def test_only_empty_folder(self):
+        # the next minute folder is created by the storage ahead of time
+        folder = (datetime.now() + timedelta(minutes=1)).strftime('%Y-%m-%d/%H/%M')
+        os.makedirs(f'{support.Config.storage_path}/{self.cam_hash}/{folder}')
+        self.assertEqual(self.videos.get({'video': ['live']}), ('', 0, False))
+        self.assertEqual(self.videos.get({'video': ['range'], 'range': ['500']}), ('', 0, False))
+
+
+if __name__ == '__main__':
+    unittest.main()